@@ -32,6 +32,7 @@ NOTE! If connected to a Crazyflie this will power on the motors!
 """
 
 from threading import Thread
+import json
 import signal
 import time
 import sys
@@ -50,7 +51,10 @@ class _LogThread(Thread):
 
     def run(self):
         while True:
-            log = self._socket.recv_json()
+            # Log messages are prefixed with a "<uri>\0<config name>\0<stream>"
+            # topic
+            [_, msg] = self._socket.recv_multipart()
+            log = json.loads(msg)
             if log["event"] == "data":
                 print(log)
             if log["event"] == "created":
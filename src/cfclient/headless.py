@@ -34,6 +34,7 @@ import sys
 import cfclient.utils
 import cflib.crtp
 from cfclient.utils.input import JoystickReader
+from cfclient.utils.periodictimer import PeriodicTimer
 from cflib.crazyflie import Crazyflie
 
 if os.name == 'posix':
@@ -112,6 +113,27 @@ class HeadlessClient():
         print("Connection failed on {}: {}".format(link, message))
         sys.exit(-1)
 
+    def log_timer_stats(self, interval):
+        """Periodically log how well the input is read at the intended
+        rate"""
+        self._stats_timer = PeriodicTimer(interval, self._log_timer_stats)
+        self._stats_timer.start()
+
+    def _log_timer_stats(self):
+        stats = self._jr.input_timer_stats()
+        if not stats["calls"]:
+            return
+        print(
+            "Input: {} reads, period {:.2f} ms, jitter p50/p99/max "
+            "{:.2f}/{:.2f}/{:.2f} ms, read time p99 {:.2f} ms, {} overruns, "
+            "{} skipped".format(
+                stats["calls"], stats["actual_period"]["mean"] * 1000
+                if stats["actual_period"] else 0,
+                stats["jitter"]["p50"] * 1000, stats["jitter"]["p99"] * 1000,
+                stats["jitter"]["max"] * 1000,
+                stats["callback_time"]["p99"] * 1000, stats["overruns"],
+                stats["skipped"]))
+
     def _input_dev_error(self, message):
         """Callback for an input device error"""
         print("Error when reading device: {}".format(message))
@@ -140,6 +162,10 @@ def main():
     parser.add_argument("--controllers", action="store_true",
                         dest="list_controllers",
                         help="Only display available controllers and exit")
+    parser.add_argument("--timer-stats", action="store", type=float,
+                        dest="timer_stats", default=0,
+                        help="Log statistics of the input read timer with "
+                             "this interval (s), 0 to disable")
     (args, unused) = parser.parse_known_args()
 
     if args.debug:
@@ -156,6 +182,8 @@ def main():
             headless.setup_controller(input_config=args.input,
                                       input_device=args.controller)
             headless.connect_crazyflie(link_uri=args.uri)
+            if args.timer_stats > 0:
+                headless.log_timer_stats(args.timer_stats)
         else:
             print("No input-device connected, exiting!")
 
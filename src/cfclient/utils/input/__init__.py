@@ -44,6 +44,7 @@ import glob
 import traceback
 import logging
 import shutil
+import time
 
 from . import inputreaders as readers
 from . import inputinterfaces as interfaces
@@ -54,6 +55,7 @@ from cfclient.utils.config_manager import ConfigManager
 
 from cfclient.utils.periodictimer import PeriodicTimer
 from cflib.utils.callbacks import Caller
+from . import eventreader
 from .mux.nomux import NoMux
 from .mux.takeovermux import TakeOverMux
 from .mux.takeoverselectivemux import TakeOverSelectiveMux
@@ -110,6 +112,7 @@ class JoystickReader(object):
         self._old_raw_thrust = 0
         self.springy_throttle = True
         self._target_height = INITAL_TAGET_HEIGHT
+        self._last_read = 0
 
         self.trim_roll = Config().get("trim_roll")
         self.trim_pitch = Config().get("trim_pitch")
@@ -144,7 +147,15 @@ class JoystickReader(object):
         self._available_devices = {}
 
         # TODO: The polling interval should be set from config file
-        self._read_timer = PeriodicTimer(INPUT_READ_PERIOD, self.read_input)
+        if Config().get("input_event_driven") and eventreader.available:
+            # Read as soon as there's input, the devices are still read every
+            # period when there's no input
+            self._read_timer = eventreader.EventReader(
+                INPUT_READ_PERIOD, Config().get("input_max_rate"),
+                self.read_input, self._input_filenos)
+        else:
+            self._read_timer = PeriodicTimer(INPUT_READ_PERIOD,
+                                             self.read_input)
 
         if do_device_discovery:
             self._discovery_timer = PeriodicTimer(1.0,
@@ -189,6 +200,17 @@ class JoystickReader(object):
                 return d
         return None
 
+    def _input_filenos(self):
+        """File descriptors of the devices that can be waited on"""
+        return [fd for fd in (d.fileno() for d in
+                              self._selected_mux.devices())
+                if fd is not None]
+
+    def input_timer_stats(self):
+        """Statistics of the timer reading the input device, see
+        PeriodicTimer.stats()"""
+        return self._read_timer.stats()
+
     def set_hover_max_height(self, height):
         self._hover_max_height = height
 
@@ -363,6 +385,11 @@ class JoystickReader(object):
 
     def read_input(self):
         """Read input data from the selected device"""
+        # Time since the last read, for integrating the height target. Reads
+        # can come more often than the period when reading on input events.
+        now = time.monotonic()
+        dt = min(now - self._last_read, INPUT_READ_PERIOD)
+        self._last_read = now
         try:
             data = self._selected_mux.read()
 
@@ -466,7 +493,7 @@ class JoystickReader(object):
                     # Scale thrust to a value between -1.0 to 1.0
                     vz = (data.thrust - 32767) / 32767.0
                     # Integrate velocity setpoint
-                    self._target_height += vz * INPUT_READ_PERIOD
+                    self._target_height += vz * dt
                     # Cap target height
                     if self._target_height > self._hover_max_height:
                         self._target_height = self._hover_max_height
@@ -503,7 +530,7 @@ class JoystickReader(object):
                         # Scale thrust to a value between -1.0 to 1.0
                         vz = (data.thrust - 32767) / 32767.0
                         # Integrate velocity setpoint
-                        self._target_height += vz * INPUT_READ_PERIOD
+                        self._target_height += vz * dt
                         # Cap target height
                         if self._target_height > self._hover_max_height:
                             self._target_height = self._hover_max_height
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+
+"""
+Event driven alternative to reading the input devices with a PeriodicTimer.
+
+The file descriptors of the input devices are waited on with epoll, so the
+callback is called as soon as there is new input instead of at the next
+expiration of the timer. The callback is called at most max_rate times per
+second and at least every keepalive seconds, also when there's no input, so
+set-points keep being sent to the Crazyflie. Only available on Linux.
+"""
+
+import logging
+import os
+import select
+import time
+from threading import Thread, Event
+
+from cflib.utils.callbacks import Caller
+from cfclient.utils.periodictimer import _TimerStats
+
+__author__ = 'Bitcraze AB'
+__all__ = ['EventReader', 'available']
+
+logger = logging.getLogger(__name__)
+
+available = hasattr(select, "epoll")
+
+
+class EventReader:
+    """Calls a callback when one of the file descriptors returned by
+    filenos() is readable, with the same interface as PeriodicTimer. The
+    file descriptors are checked again before every wait, so devices can be
+    opened and closed while it is running. The epoll set is only updated
+    when they change, and after every keepalive without input."""
+
+    def __init__(self, keepalive, max_rate, callback, filenos):
+        self._callbacks = Caller()
+        self._callbacks.add_callback(callback)
+        self._keepalive = keepalive
+        self._min_period = 1.0 / max_rate
+        self._filenos = filenos
+        self._thread = None
+        self._stats = _TimerStats(keepalive)
+
+    def start(self):
+        """Start waiting for input"""
+        if self._thread:
+            logger.warning("Event reader already started, not restarting")
+            return
+        self._thread = _EventReaderThread(self._keepalive, self._min_period,
+                                          self._callbacks, self._filenos,
+                                          self._stats)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop waiting for input"""
+        if self._thread:
+            self._thread.stop()
+            self._thread = None
+
+    def stats(self):
+        """Same statistics as PeriodicTimer.stats(), where the jitter is the
+        time from the input (or keepalive) until the callback was called"""
+        return self._stats.snapshot()
+
+
+class _EventReaderThread(Thread):
+
+    def __init__(self, keepalive, min_period, caller, filenos, stats):
+        super(_EventReaderThread, self).__init__()
+        self._keepalive = keepalive
+        self._min_period = min_period
+        self._callbacks = caller
+        self._filenos = filenos
+        self._stats = stats
+        self._stopped = Event()
+        self._epoll = select.epoll()
+        self._registered = set()
+        # Written to when stopping, to wake up the thread
+        (self._wakeup_in, self._wakeup_out) = os.pipe()
+        self._epoll.register(self._wakeup_in, select.EPOLLIN)
+
+    def stop(self):
+        # The thread closes the pipe once stopped, so write to it first
+        os.write(self._wakeup_out, b"\0")
+        self._stopped.set()
+
+    def _update_filenos(self, recheck):
+        try:
+            filenos = set(self._filenos())
+        except Exception as e:
+            logger.warning("Could not get input file descriptors: "
+                           "{}".format(e))
+            filenos = set()
+        if filenos == self._registered and not recheck:
+            return
+        for fd in self._registered - filenos:
+            try:
+                self._epoll.unregister(fd)
+            except (OSError, ValueError):
+                # Already closed, which removes it from the epoll set
+                pass
+        registered = set()
+        for fd in filenos:
+            # A closed file descriptor is dropped from the epoll set and its
+            # number can be reused when a device is opened again, so
+            # modify() is used to check that it's still in the set
+            try:
+                try:
+                    self._epoll.modify(fd, select.EPOLLIN)
+                except FileNotFoundError:
+                    self._epoll.register(fd, select.EPOLLIN)
+            except OSError as e:
+                # Closed by another thread since filenos() returned it
+                logger.debug("Not waiting on input fd {}: {}".format(fd, e))
+                continue
+            registered.add(fd)
+        self._registered = registered
+
+    def run(self):
+        last_call = time.monotonic()
+        events = []
+        try:
+            while not self._stopped.is_set():
+                # A device closed and opened again can get the same file
+                # descriptor, so the set is rechecked when there's no input
+                self._update_filenos(not events)
+                deadline = last_call + self._keepalive
+                events = self._epoll.poll(max(0.0, deadline -
+                                              time.monotonic()))
+                if self._stopped.is_set():
+                    break
+                now = time.monotonic()
+                woken = now if events else deadline
+                # Limit the rate when input keeps arriving
+                if now < last_call + self._min_period and \
+                        self._stopped.wait(last_call + self._min_period -
+                                           now):
+                    break
+                last_call = time.monotonic()
+                self._callbacks.call()
+                end = time.monotonic()
+                self._stats.add(last_call, woken, end)
+                if end > last_call + self._keepalive:
+                    self._stats.behind(1, 0)
+        finally:
+            self._epoll.close()
+            os.close(self._wakeup_in)
+            os.close(self._wakeup_out)
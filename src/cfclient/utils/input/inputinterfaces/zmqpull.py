@@ -30,13 +30,14 @@
 Input interface that supports receiving commands via ZMQ.
 """
 
+import json
 import logging
-from threading import Thread
 
 from cfclient.utils.config import Config
 
 try:
     import zmq
+    from cfclient.utils.zmq_reactor import ZMQReactor
 except Exception as e:
     raise Exception("ZMQ library probably not installed ({})".format(e))
 
@@ -54,25 +55,12 @@ MODULE_MAIN = "ZMQReader"
 MODULE_NAME = "ZMQ"
 
 
-class _PullReader(Thread):
-
-    def __init__(self, receiver, callback, *args):
-        super(_PullReader, self).__init__(*args)
-        self._receiver = receiver
-        self._cb = callback
-        self.daemon = True
-
-    def run(self):
-        while True:
-            self._cb(self._receiver.recv_json())
-
-
 class ZMQReader:
     """Used for reading data from input devices using the PyGame API."""
 
     def __init__(self):
-        context = zmq.Context()
-        receiver = context.socket(zmq.PULL)
+        reactor = ZMQReactor()
+        receiver = reactor.context.socket(zmq.PULL)
         self._bind_addr = "tcp://127.0.0.1:{}".format(ZMQ_PULL_PORT)
         # If the port is already bound an exception will be thrown
         # and caught in the initialization of the readers and handled.
@@ -93,12 +81,17 @@ class ZMQReader:
 
         logger.info("Initialized ZMQ")
 
-        self._receiver_thread = _PullReader(receiver, self._cmd_callback)
-        self._receiver_thread.start()
-
-    def _cmd_callback(self, cmd):
-        for k in list(cmd["ctrl"].keys()):
-            self.data[k] = cmd["ctrl"][k]
+        reactor.register(receiver, self._cmd_callback)
+
+    def _cmd_callback(self, frames):
+        try:
+            cmd = json.loads(frames[-1])
+            ctrl = cmd["ctrl"]
+        except (ValueError, KeyError) as e:
+            logger.warning("Dropping invalid input ({})".format(e))
+            return
+        for k in list(ctrl.keys()):
+            self.data[k] = ctrl[k]
 
     def open(self, device_id):
         """
@@ -36,64 +36,97 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class _ToggleState(dict):
+AXES = ("roll", "pitch", "yaw", "thrust")
+BUTTONS = ("pitchNeg", "pitchPos", "rollNeg", "rollPos",
+           "assistedControl", "estop", "arm",
+           "exitapp", "alt1", "alt2", "muxswitch")
 
-    def __getattr__(self, attr):
-        return self.get(attr)
+# Index of every indicator in InputData.values and the toggle bit of every
+# button (0 for the axes)
+_INDEXES = {name: i for (i, name) in enumerate(AXES + BUTTONS)}
+_BITS = (0, ) * len(AXES) + tuple(1 << i for i in range(len(BUTTONS)))
+_BUTTON_BITS = {name: _BITS[_INDEXES[name]] for name in BUTTONS}
 
-    __setattr__ = dict.__setitem__
-    __delattr__ = dict.__delitem__
+_NO_AXES = (0.0, ) * len(AXES)
+_NO_BUTTONS = (False, ) * len(BUTTONS)
 
 
-class InputData:
+class _ButtonMask(object):
+    """One bit per button, readable by button name"""
+    __slots__ = ("mask", )
 
     def __init__(self):
-        # self._toggled = {}
-        self._axes = ("roll", "pitch", "yaw", "thrust")
-        self._buttons = ("pitchNeg", "pitchPos", "rollNeg", "rollPos",
-                         "assistedControl", "estop", "arm",
-                         "exitapp", "alt1", "alt2", "muxswitch")
-        for axis in self._axes:
-            self.__dict__[axis] = 0.0
-        self.toggled = _ToggleState()
-        self._prev_btn_values = {}
-        for button in self._buttons:
-            self.__dict__[button] = False
-            self.toggled[button] = False
-            self._prev_btn_values[button] = False
-
-    def get_all_indicators(self):
-        return self._axes + self._buttons
-
-    def _check_toggle(self, key, data):
-        if key not in self._prev_btn_values:
-            self._prev_btn_values[key] = data
-        elif self._prev_btn_values[key] != data:
-            self._prev_btn_values[key] = data
-            return True
-        return False
+        self.mask = 0
+
+    def __getitem__(self, name):
+        return bool(self.mask & _BUTTON_BITS[name])
+
+    def __getattr__(self, name):
+        try:
+            return bool(self.mask & _BUTTON_BITS[name])
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _field(index):
+    def get(self):
+        return self.values[index]
+
+    def set(self, value):
+        self.values[index] = value
+
+    return property(get, set)
+
+
+class InputData(object):
+    """The axes and buttons of an input device, kept in a list with a fixed
+    index for every indicator. The indicators are also attributes."""
+    __slots__ = ("values", "toggled", "_prev_btn_values")
+
+    def __init__(self):
+        self.values = list(_NO_AXES + _NO_BUTTONS)
+        self.toggled = _ButtonMask()
+        self._prev_btn_values = _ButtonMask()
+
+    @staticmethod
+    def get_all_indicators():
+        return AXES + BUTTONS
+
+    @staticmethod
+    def index(name):
+        """Index of an indicator in values, None for unknown names"""
+        return _INDEXES.get(name)
 
     def reset_axes(self):
-        for axis in self._axes:
-            self.__dict__[axis] = 0.0
+        self.values[:len(AXES)] = _NO_AXES
 
     def reset_buttons(self):
-        for button in self._buttons:
-            self.__dict__[button] = False
+        self.values[len(AXES):] = _NO_BUTTONS
+
+    def set_index(self, index, value):
+        self.values[index] = value
+        bit = _BITS[index]
+        if bit:
+            prev = self._prev_btn_values
+            if bool(prev.mask & bit) != bool(value):
+                prev.mask ^= bit
+                self.toggled.mask |= bit
+            else:
+                self.toggled.mask &= ~bit
 
     def set(self, name, value):
-        try:
-            if name in self._buttons:
-                if self._check_toggle(name, value):
-                    self.toggled[name] = True
-                else:
-                    self.toggled[name] = False
-        except KeyError:
-            pass
-        self.__dict__[name] = value
+        # Names that are not indicators are ignored
+        index = _INDEXES.get(name)
+        if index is not None:
+            self.set_index(index, value)
 
     def get(self, name):
-        return self.__dict__[name]
+        return self.values[_INDEXES[name]]
+
+
+for (_i, _name) in enumerate(AXES + BUTTONS):
+    setattr(InputData, _name, _field(_i))
+del _i, _name
 
 
 class InputReaderInterface(object):
@@ -143,6 +176,11 @@ class InputReaderInterface(object):
     def close(self):
         return
 
+    def fileno(self):
+        """File descriptor that is readable when the device has new input,
+        None if the device has to be polled"""
+        return None
+
     @staticmethod
     def devices():
         """List all the available devices."""
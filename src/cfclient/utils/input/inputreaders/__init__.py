@@ -34,6 +34,7 @@ directory and it will be picked up automatically.
 """
 
 import logging
+from ..inputreaderinterface import InputData
 from ..inputreaderinterface import InputReaderInterface
 
 __author__ = 'Bitcraze AB'
@@ -80,6 +81,35 @@ def devices():
     return available_devices
 
 
+class _CompiledMap():
+    """Input map prepared for reading the device: the index, InputData field
+    index, offset and scale of every mapped axis and the index and field index
+    of every mapped button, in index order. Entries that could never be used
+    are left out."""
+
+    def __init__(self, input_map):
+        self.axes = []
+        self.buttons = []
+        for (index, mapping) in input_map.items():
+            (prefix, _, number) = index.rpartition("-")
+            try:
+                number = int(number)
+                field = InputData.index(mapping["key"])
+                if field is None:
+                    continue
+                if prefix == "Input.AXIS" and \
+                        mapping["type"] == "Input.AXIS":
+                    self.axes.append((number, field,
+                                      mapping["offset"], mapping["scale"]))
+                elif prefix == "Input.BUTTON" and \
+                        mapping["type"] == "Input.BUTTON":
+                    self.buttons.append((number, field))
+            except (KeyError, TypeError, ValueError):
+                pass
+        self.axes.sort(key=lambda a: a[0])
+        self.buttons.sort(key=lambda b: b[0])
+
+
 class InputDevice(InputReaderInterface):
 
     def __init__(self, dev_name, dev_id, dev_reader):
@@ -101,43 +131,52 @@ class InputDevice(InputReaderInterface):
     def close(self):
         self._reader.close(self.id)
 
+    def fileno(self):
+        if hasattr(self._reader, "fileno"):
+            return self._reader.fileno(self.id)
+        return None
+
     def set_dead_band(self, db):
         self.db = db
 
+    @property
+    def input_map(self):
+        return self._input_map
+
+    @input_map.setter
+    def input_map(self, input_map):
+        # Compile the map once instead of looking up every axis and button
+        # in it on every read
+        self._input_map = input_map
+        self._compiled_map = None
+        if input_map:
+            self._compiled_map = _CompiledMap(input_map)
+
     def read(self, include_raw=False):
         [axis, buttons] = self._reader.read(self.id)
 
+        compiled = self._compiled_map
+        data = self.data
+
         # To support split axis we need to zero all the axis
-        self.data.reset_axes()
+        data.reset_axes()
 
-        i = 0
-        for a in axis:
-            index = "Input.AXIS-%d" % i
-            try:
-                if self.input_map[index]["type"] == "Input.AXIS":
-                    key = self.input_map[index]["key"]
-                    axisvalue = a + self.input_map[index]["offset"]
-                    axisvalue = axisvalue / self.input_map[index]["scale"]
-                    self.data.set(key, axisvalue + self.data.get(key))
-            except (KeyError, TypeError):
-                pass
-            i += 1
+        if compiled:
+            values = data.values
+            axes_count = len(axis)
+            for (i, field, offset, scale) in compiled.axes:
+                if i < axes_count:
+                    values[field] += (axis[i] + offset) / scale
 
         # Workaround for fixing issues during mapping (remapping buttons while
         # they are pressed.
-        self.data.reset_buttons()
+        data.reset_buttons()
 
-        i = 0
-        for b in buttons:
-            index = "Input.BUTTON-%d" % i
-            try:
-                if self.input_map[index]["type"] == "Input.BUTTON":
-                    key = self.input_map[index]["key"]
-                    self.data.set(key, True if b == 1 else False)
-            except (KeyError, TypeError):
-                # Button not mapped, ignore..
-                pass
-            i += 1
+        if compiled:
+            buttons_count = len(buttons)
+            for (i, field) in compiled.buttons:
+                if i < buttons_count:
+                    data.set_index(field, buttons[i] == 1)
 
         self.data.roll = InputDevice.deadband(self.data.roll, self.db)
         self.data.pitch = InputDevice.deadband(self.data.pitch, self.db)
@@ -49,6 +49,7 @@ __all__ = ['Joystick']
 logger = logging.getLogger(__name__)
 
 JS_EVENT_FMT = "@IhBB"
+JS_EVENT = struct.Struct(JS_EVENT_FMT)
 JE_TIME = 0
 JE_VALUE = 1
 JE_TYPE = 2
@@ -58,6 +59,9 @@ JS_EVENT_BUTTON = 0x001
 JS_EVENT_AXIS = 0x002
 JS_EVENT_INIT = 0x080
 
+# Maximum number of events read from the device with one read
+READ_EVENTS = 64
+
 # ioctls
 JSIOCGAXES = 0x80016a11
 JSIOCGBUTTONS = 0x80016a12
@@ -98,13 +102,20 @@ class _JS():
         self.buttons = []
         self.axes = []
         self._prev_pressed = {}
+        # Time (in ms, from the driver) of the last event read
+        self.event_time = None
+        self._buf = bytearray(JS_EVENT.size * READ_EVENTS)
+        self._view = memoryview(self._buf)
 
     def open(self):
         if self._f:
             raise Exception("{} at {} is already "
                             "opened".format(self.name, self._f_name))
 
-        self._f = open("/dev/input/js{}".format(self.num), "rb")
+        # Unbuffered, so reads go straight to the device and return None
+        # instead of raising when there are no events
+        self._f = open("/dev/input/js{}".format(self.num), "rb",
+                       buffering=0)
         fcntl.fcntl(self._f.fileno(), fcntl.F_SETFL, os.O_NONBLOCK)
 
         # Get number of axis and button
@@ -133,11 +144,17 @@ class _JS():
         self._f.close()
         self._f = None
 
+    def fileno(self):
+        """File descriptor of the device, None if it's not opened"""
+        if not self._f:
+            return None
+        return self._f.fileno()
+
     def __initvalues(self):
         """Read the buttons and axes initial values from the js device"""
         for _ in range(len(self.axes) + len(self.buttons)):
-            data = self._f.read(struct.calcsize(JS_EVENT_FMT))
-            jsdata = struct.unpack(JS_EVENT_FMT, data)
+            data = self._f.read(JS_EVENT.size)
+            jsdata = JS_EVENT.unpack(data)
             self.__updatestate(jsdata)
 
     def __updatestate(self, jsdata):
@@ -163,17 +180,21 @@ class _JS():
         """Consume all the events queued up in the JS device"""
         try:
             while True:
-                data = self._f.read(struct.calcsize(JS_EVENT_FMT))
-                jsdata = struct.unpack(JS_EVENT_FMT, data)
-                self.__updatestate(jsdata)
+                size = self._f.readinto(self._buf)
+                if not size:
+                    return
+                # The driver only returns whole events
+                for jsdata in JS_EVENT.iter_unpack(self._view[:size]):
+                    self.__updatestate(jsdata)
+                self.event_time = jsdata[JE_TIME]
+                if size < len(self._buf):
+                    return
         except IOError as e:
             if e.errno != 11:
                 logger.info(str(e))
                 self._f.close()
                 self._f = None
                 raise IOError("Device has been disconnected")
-        except TypeError:
-            pass
         except ValueError:
             # This will happen if I/O operations are done on a closed device,
             # which is the case when you first close and then open the device
@@ -231,6 +252,15 @@ class Joystick():
         """Open the joystick device"""
         self._js[device_id].close()
 
+    def fileno(self, device_id):
+        """File descriptor that is readable when there are new events"""
+        return self._js[device_id].fileno()
+
+    def event_time(self, device_id):
+        """Time (in ms, from the driver) of the last event read from the
+        device, None if no event has been read"""
+        return self._js[device_id].event_time
+
     def read(self, device_id):
         """ Returns a list of all joystick event since the last call """
         return self._js[device_id].read()
@@ -44,7 +44,5 @@ class TakeOverMux(TakeOverSelectiveMux):
     def __init__(self, *args):
         super(TakeOverMux, self).__init__(*args)
         self.name = "Teacher (RPYT)"
-        self._muxing = {
-            self._master: ("estop", "alt1", "alt2", "assistedControl", "exit"),
-            self._slave: ("roll", "pitch", "yaw", "thrust")
-        }
+        self._set_muxing(("estop", "alt1", "alt2", "assistedControl", "exit"),
+                         ("roll", "pitch", "yaw", "thrust"))
@@ -34,6 +34,7 @@ roll/pitch as well.
 import logging
 
 from . import InputMux
+from ..inputreaderinterface import InputData
 
 __author__ = 'Bitcraze AB'
 __all__ = ['TakeOverSelectiveMux']
@@ -50,11 +51,18 @@ class TakeOverSelectiveMux(InputMux):
         self.name = "Teacher (RP)"
         self._devs = {self._master: None, self._slave: None}
 
+        self._set_muxing(("thrust", "yaw", "estop", "alt1", "alt2",
+                          "assistedControl", "exit"),
+                         ("roll", "pitch"))
+
+    def _set_muxing(self, master, slave):
         self._muxing = {
-            self._master: ("thrust", "yaw", "estop", "alt1", "alt2",
-                           "assistedControl", "exit"),
-            self._slave: ("roll", "pitch")
+            self._master: master,
+            self._slave: slave
         }
+        # The fields of the slave are copied into the master data by index
+        self._slave_fields = tuple(InputData.index(key) for key in slave
+                                   if InputData.index(key) is not None)
 
     def read(self):
         try:
@@ -62,8 +70,10 @@ class TakeOverSelectiveMux(InputMux):
                 dm = self._devs[self._master].read()
                 ds = self._devs[self._slave].read()
                 if not dm.muxswitch:
-                    for key in self._muxing[self._slave]:
-                        dm.set(key, ds.get(key))
+                    master_values = dm.values
+                    slave_values = ds.values
+                    for i in self._slave_fields:
+                        master_values[i] = slave_values[i]
 
                 return dm
             else:
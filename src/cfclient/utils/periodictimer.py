@@ -28,35 +28,109 @@
 """
 Implementation of a periodic timer that will call a callback every time
 the timer expires once started.
+
+The timer expires at absolute deadlines (start + n * period, using the
+monotonic clock), so the time the callbacks take and the scheduling delays
+don't add up over time. If the callbacks finish after the next deadline the
+policy decides what happens: CATCH_UP calls the callbacks for all the missed
+expirations right away, while SKIP drops the expirations that are a full
+period or more in the past and calls the callbacks right away for the latest
+one.
 """
 
 import logging
-from threading import Thread
+from collections import deque
+from threading import Thread, Event, Lock
 from cflib.utils.callbacks import Caller
 import time
 
 __author__ = 'Bitcraze AB'
-__all__ = ['PeriodicTimer']
+__all__ = ['PeriodicTimer', 'CATCH_UP', 'SKIP']
 
 logger = logging.getLogger(__name__)
 
+CATCH_UP = "catch_up"
+SKIP = "skip"
+
+# Number of expirations the statistics are computed over
+STATS_SAMPLES = 1000
+
+
+def _summary(values):
+    """Mean, percentiles and max of a list of values"""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def _percentile(p):
+        return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+    return {"mean": sum(values) / len(values), "p50": _percentile(50),
+            "p90": _percentile(90), "p99": _percentile(99),
+            "max": values[-1]}
+
+
+class _TimerStats():
+    """Statistics of the last expirations of a timer, all times are in
+    seconds"""
+
+    def __init__(self, period):
+        self._period = period
+        self._lock = Lock()
+        self._calls = 0
+        self._overruns = 0
+        self._skipped = 0
+        self._last_start = None
+        self._periods = deque(maxlen=STATS_SAMPLES)
+        self._lateness = deque(maxlen=STATS_SAMPLES)
+        self._durations = deque(maxlen=STATS_SAMPLES)
+
+    def add(self, start, deadline, end):
+        with self._lock:
+            self._calls += 1
+            if self._last_start is not None:
+                self._periods.append(start - self._last_start)
+            self._last_start = start
+            self._lateness.append(start - deadline)
+            self._durations.append(end - start)
+
+    def behind(self, overrun, skipped):
+        with self._lock:
+            self._overruns += overrun
+            self._skipped += skipped
+
+    def snapshot(self):
+        with self._lock:
+            out = {"period": self._period, "calls": self._calls,
+                   "overruns": self._overruns, "skipped": self._skipped}
+            periods = list(self._periods)
+            lateness = list(self._lateness)
+            durations = list(self._durations)
+        out["actual_period"] = _summary(periods)
+        out["jitter"] = _summary(lateness)
+        out["callback_time"] = _summary(durations)
+        return out
+
 
 class PeriodicTimer:
     """Create a periodic timer that will periodically call a callback"""
 
-    def __init__(self, period, callback):
+    def __init__(self, period, callback, policy=SKIP):
         self._callbacks = Caller()
         self._callbacks.add_callback(callback)
         self._started = False
         self._period = period
+        self._policy = policy
         self._thread = None
+        self._stats = _TimerStats(period)
 
     def start(self):
         """Start the timer"""
         if self._thread:
             logger.warning("Timer already started, not restarting")
             return
-        self._thread = _PeriodicTimerThread(self._period, self._callbacks)
+        self._thread = _PeriodicTimerThread(self._period, self._callbacks,
+                                            self._policy, self._stats)
         self._thread.daemon = True
         self._thread.start()
 
@@ -66,21 +140,47 @@ class PeriodicTimer:
             self._thread.stop()
             self._thread = None
 
+    def stats(self):
+        """Statistics of the last expirations: the number of calls,
+        overruns (the callbacks finished after the next deadline) and
+        skipped expirations, and the actual period, jitter (how late the
+        callbacks were called) and time spent in the callbacks (in s)"""
+        return self._stats.snapshot()
+
 
 class _PeriodicTimerThread(Thread):
 
-    def __init__(self, period, caller):
+    def __init__(self, period, caller, policy, stats):
         super(_PeriodicTimerThread, self).__init__()
         self._period = period
         self._callbacks = caller
-        self._stop = False
+        self._policy = policy
+        self._stats = stats
+        # Not named _stop, which is used by Thread itself
+        self._stopped = Event()
 
     def stop(self):
-        self._stop = True
+        self._stopped.set()
 
     def run(self):
-        while not self._stop:
-            time.sleep(self._period)
-            if self._stop:
+        deadline = time.monotonic() + self._period
+        while True:
+            delay = deadline - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                break
+            if self._stopped.is_set():
                 break
+            start = time.monotonic()
             self._callbacks.call()
+            end = time.monotonic()
+            self._stats.add(start, deadline, end)
+            deadline += self._period
+            if end < deadline:
+                continue
+            skipped = 0
+            if self._policy == SKIP:
+                # Less than a period late is run right away, only the
+                # deadlines at least a full period in the past are dropped
+                skipped = int((end - deadline) / self._period)
+                deadline += skipped * self._period
+            self._stats.behind(1, skipped)
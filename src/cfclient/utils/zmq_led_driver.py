@@ -28,20 +28,27 @@
 
 """
 Give access to the LED driver memory via ZMQ.
+
+Only one write to the memory is done at a time. LED values received while a
+write is in progress replace each other, and the newest ones are written
+when the write is done.
 """
 
 from cflib.crazyflie.mem import MemoryElement
 from cfclient.utils.config import Config
 
+import json
 import logging
-from threading import Thread, Lock
 
 ZMQ_PULL_PORT = 1024 + 190
+# Time (in seconds) to wait for a write to the memory before giving up on it
+WRITE_TIMEOUT = 2
 logger = logging.getLogger(__name__)
 
 enabled = False
 try:
     import zmq
+    from cfclient.utils.zmq_reactor import ZMQReactor
 
     enabled = True
 except Exception as e:
@@ -53,23 +60,6 @@ if not Config().get("enable_zmq_led"):
     logger.info("ZMQ led disabled in config file")
 
 
-class _PullReader(Thread):
-    """Blocking thread for reading from ZMQ socket"""
-
-    def __init__(self, receiver, callback, *args):
-        """Initialize"""
-        super(_PullReader, self).__init__(*args)
-        self._receiver = receiver
-        self._cb = callback
-        self.daemon = True
-        self.lock = Lock()
-
-    def run(self):
-        while True:
-            # self.lock.acquire()
-            self._cb(self._receiver.recv_json())
-
-
 class ZMQLEDDriver:
     """Used for reading data from input devices using the PyGame API."""
 
@@ -77,31 +67,57 @@ class ZMQLEDDriver:
 
         if enabled:
             self._cf = crazyflie
-            context = zmq.Context()
-            self._receiver = context.socket(zmq.PULL)
+            self._reactor = ZMQReactor()
+            self._receiver = self._reactor.context.socket(zmq.PULL)
             self._bind_addr = "tcp://*:{}".format(ZMQ_PULL_PORT)
             # If the port is already bound an exception will be thrown
             # and caught in the initialization of the readers and handled.
             self._receiver.bind(self._bind_addr)
             logger.info("Biding ZMQ for LED driver"
                         "at {}".format(self._bind_addr))
-            self._receiver_thread = _PullReader(self._receiver,
-                                                self._cmd_callback)
+            # Only used from the reactor thread
+            self._pending = None
+            self._write_timer = None
+            self._writes = 0
 
     def start(self):
         if enabled:
-            self._receiver_thread.start()
+            self._reactor.register(self._receiver, self._cmd_callback)
 
-    def _cmd_callback(self, data):
+    def _cmd_callback(self, frames):
         """Called when new data arrives via ZMQ"""
+        try:
+            self._pending = json.loads(frames[-1])["rgbleds"]
+        except (ValueError, KeyError) as e:
+            logger.warning("Dropping invalid LED data ({})".format(e))
+            return
+        if not self._write_timer:
+            self._write_pending()
+
+    def _write_pending(self):
+        rgbleds = self._pending
+        self._pending = None
         if len(self._cf.mem.get_mems(MemoryElement.TYPE_DRIVER_LED)) > 0:
             logger.info("Updating memory")
             memory = self._cf.mem.get_mems(MemoryElement.TYPE_DRIVER_LED)[0]
-            for i_led in range(len(data["rgbleds"])):
-                memory.leds[i_led].set(data["rgbleds"][i_led][0],
-                                       data["rgbleds"][i_led][1],
-                                       data["rgbleds"][i_led][2])
-            memory.write_data(self._write_cb)
-
-    def _write_cb(self, mem, addr):
-        return
+            for i_led in range(len(rgbleds)):
+                memory.leds[i_led].set(rgbleds[i_led][0],
+                                       rgbleds[i_led][1],
+                                       rgbleds[i_led][2])
+            # The callback is not called if the write fails
+            self._writes += 1
+            write = self._writes
+            self._write_timer = self._reactor.call_later(
+                WRITE_TIMEOUT, self._written, write)
+            memory.write_data(
+                lambda mem, addr: self._reactor.call_soon(self._written,
+                                                          write))
+
+    def _written(self, write):
+        if write != self._writes or not self._write_timer:
+            # Already timed out
+            return
+        self._write_timer.cancel()
+        self._write_timer = None
+        if self._pending is not None:
+            self._write_pending()
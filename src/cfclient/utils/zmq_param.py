@@ -28,19 +28,26 @@
 
 """
 Give access to the parameter framework via ZMQ.
+
+Requests are handled as they arrive, so any number of clients can have
+requests waiting for the Crazyflie at the same time. Clients using REQ
+sockets work as before.
 """
 
+import json
 import logging
-from threading import Thread, Lock
 
 from cfclient.utils.config import Config
 
 ZMQ_PULL_PORT = 1024 + 189
+# Time (in seconds) to wait for the Crazyflie to confirm a param write
+PARAM_TIMEOUT = 2
 logger = logging.getLogger(__name__)
 
 enabled = False
 try:
     import zmq
+    from cfclient.utils.zmq_reactor import ZMQReactor
 
     enabled = True
 except Exception as e:
@@ -52,21 +59,6 @@ if not Config().get("enable_zmq_param"):
     logger.info("ZMQ param disabled in config file")
 
 
-class _PullReader(Thread):
-
-    def __init__(self, receiver, callback, *args):
-        super(_PullReader, self).__init__(*args)
-        self._receiver = receiver
-        self._cb = callback
-        self.daemon = True
-        self.lock = Lock()
-
-    def run(self):
-        while True:
-            self.lock.acquire()
-            self._cb(self._receiver.recv_json())
-
-
 class ZMQParamAccess:
     """Used for reading data from input devices using the PyGame API."""
 
@@ -74,42 +66,111 @@ class ZMQParamAccess:
 
         if enabled:
             self._cf = crazyflie
-            context = zmq.Context()
-            self._receiver = context.socket(zmq.REP)
+            self._reactor = ZMQReactor()
+            self._receiver = self._reactor.context.socket(zmq.ROUTER)
             self._bind_addr = "tcp://*:{}".format(ZMQ_PULL_PORT)
             # If the port is already bound an exception will be thrown
             # and caught in the initialization of the readers and handled.
             self._receiver.bind(self._bind_addr)
             logger.info(
                 "Biding ZMQ for parameters at {}".format(self._bind_addr))
-            self._receiver_thread = _PullReader(self._receiver,
-                                                self._cmd_callback)
+            # Requests waiting for a param to be updated, by param name.
+            # Only used from the reactor thread.
+            self._waiters = {}
 
     def start(self):
         if enabled:
-            self._receiver_thread.start()
-
-    def _cmd_callback(self, data):
+            self._reactor.register(self._receiver, self._cmd_callback)
+
+    def _reply(self, envelope, response):
+        self._receiver.send_multipart(envelope +
+                                      [json.dumps(response).encode()])
+
+    def _cmd_callback(self, frames):
+        # REQ clients add an empty delimiter frame, so the request is always
+        # the last frame and everything before it is sent back
+        envelope = frames[:-1]
+        try:
+            data = json.loads(frames[-1])
+            cmd = data["cmd"]
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(envelope, {"version": 1, "status": 1,
+                                   "msg": "Invalid request: {}".format(e)})
+            return
         # logger.info(data)
-        if data["cmd"] == "toc":
+        if cmd == "toc":
             response = {"version": 1, "toc": []}
-            self._receiver.send_json(response)
-            self._receiver_thread.lock.release()
-        if data["cmd"] == "set":
-            resp = {"version": 1}  # noqa
-            group = data["name"].split(".")[0]
-            name = data["name"].split(".")[1]
-            self._cf.param.add_update_callback(group=group, name=name,
+            self._reply(envelope, response)
+        elif cmd == "set":
+            name = data.get("name")
+            if not isinstance(name, str) or len(name.split(".")) != 2:
+                self._reply(envelope, {"version": 1, "cmd": "set",
+                                       "name": name, "status": 1,
+                                       "msg": "Invalid param name {}, "
+                                              "expected group.name".format(
+                                                  name)})
+            elif "value" not in data:
+                self._reply(envelope, {"version": 1, "cmd": "set",
+                                       "name": name, "status": 1,
+                                       "msg": "No value given for {}".format(
+                                           name)})
+            else:
+                self._set(envelope, name, data["value"])
+        else:
+            self._reply(envelope, {"version": 1, "status": 1,
+                                   "msg": "Unknown command {}".format(cmd)})
+
+    def _set(self, envelope, name, value):
+        waiters = self._waiters.setdefault(name, [])
+        if not waiters:
+            group = name.split(".")[0]
+            name_short = name.split(".")[1]
+            self._cf.param.add_update_callback(group=group, name=name_short,
                                                cb=self._param_callback)
-            self._cf.param.set_value(data["name"], str(data["value"]))
-
-    def _param_callback(self, name, value):
+        timer = self._reactor.call_later(PARAM_TIMEOUT, self._timeout, name,
+                                         envelope)
+        waiters.append((envelope, timer))
+        try:
+            self._cf.param.set_value(name, str(value))
+        except Exception as e:
+            self._remove_waiter(name, envelope)
+            self._reply(envelope, {"version": 1, "cmd": "set", "name": name,
+                                   "status": 1, "msg": str(e)})
+
+    def _remove_waiter(self, name, envelope):
+        waiters = self._waiters.get(name, [])
+        for waiter in waiters:
+            if waiter[0] is envelope:
+                waiter[1].cancel()
+                waiters.remove(waiter)
+                break
+        if not waiters:
+            self._waiters.pop(name, None)
+            self._remove_callback(name)
+
+    def _remove_callback(self, name):
         group = name.split(".")[0]
         name_short = name.split(".")[1]
         logger.info("Removing {}.{}".format(group, name_short))
         self._cf.param.remove_update_callback(group=group, name=name_short,
                                               cb=self._param_callback)
 
+    def _timeout(self, name, envelope):
+        self._remove_waiter(name, envelope)
+        self._reply(envelope, {"version": 1, "cmd": "set", "name": name,
+                               "status": 1,
+                               "msg": "Timeout when setting {}".format(name)})
+
+    def _param_callback(self, name, value):
+        # Called from the cflib thread
+        self._reactor.call_soon(self._param_updated, name, value)
+
+    def _param_updated(self, name, value):
+        waiters = self._waiters.pop(name, [])
+        if not waiters:
+            return
+        self._remove_callback(name)
         response = {"version": 1, "cmd": "set", "name": name, "value": value}
-        self._receiver.send_json(response)
-        self._receiver_thread.lock.release()
+        for (envelope, timer) in waiters:
+            timer.cancel()
+            self._reply(envelope, response)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+
+"""
+Shared ZMQ context and reactor thread for the ZMQ services of the client.
+
+All the sockets are polled from one thread, which calls the handler of a
+socket with every message received on it. ZMQ sockets can only be used from
+one thread, so after a socket is registered it must only be used from the
+handlers and from functions passed to call_soon and call_later.
+"""
+
+import heapq
+import logging
+import socket
+import time
+from collections import deque
+from threading import Thread, Lock
+
+import zmq
+
+from cfclient.utils.singleton import Singleton
+
+__author__ = 'Bitcraze AB'
+__all__ = ['ZMQReactor']
+
+logger = logging.getLogger(__name__)
+
+
+class _Timer():
+    """Function scheduled with call_later, cancel() stops it from being
+    called"""
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ZMQReactor(metaclass=Singleton):
+    """One ZMQ context and one thread serving all the registered sockets.
+    The thread is started when the first socket is registered."""
+
+    def __init__(self):
+        self.context = zmq.Context.instance()
+        self._poller = zmq.Poller()
+        self._handlers = {}
+        self._calls = deque()
+        self._timers = []
+        self._lock = Lock()
+        self._thread = None
+        # Other threads wake up the reactor by writing to a socket pair,
+        # which can be polled together with the ZMQ sockets on all platforms
+        (self._wakeup_in, self._wakeup_out) = socket.socketpair()
+        self._wakeup_in.setblocking(False)
+        self._wakeup_out.setblocking(False)
+        # Plain sockets are reported by file descriptor when polling
+        self._wakeup_fd = self._wakeup_in.fileno()
+        self._poller.register(self._wakeup_fd, zmq.POLLIN)
+
+    def register(self, sock, handler):
+        """Call handler with the frames of every message received on sock"""
+        self.call_soon(self._register, sock, handler)
+        with self._lock:
+            if not self._thread:
+                self._thread = Thread(target=self._run, name="ZMQReactor")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _register(self, sock, handler):
+        self._handlers[sock] = handler
+        self._poller.register(sock, zmq.POLLIN)
+
+    def call_soon(self, callback, *args):
+        """Call a function from the reactor thread, can be called from any
+        thread"""
+        self._calls.append((callback, args))
+        try:
+            self._wakeup_out.send(b"\0")
+        except BlockingIOError:
+            # There are already wake-ups waiting to be read
+            pass
+
+    def call_later(self, delay, callback, *args):
+        """Call a function from the reactor thread after delay seconds,
+        returns a timer that can be cancelled"""
+        timer = _Timer(time.monotonic() + delay, callback, args)
+        self.call_soon(heapq.heappush, self._timers, timer)
+        return timer
+
+    def send_multipart(self, sock, frames):
+        """Send a message on a registered socket from any thread"""
+        self.call_soon(sock.send_multipart, frames)
+
+    def _run(self):
+        while True:
+            while self._calls:
+                (callback, args) = self._calls.popleft()
+                self._call(callback, *args)
+            timeout = self._run_timers()
+            for (sock, _) in self._poller.poll(timeout):
+                if sock == self._wakeup_fd:
+                    self._drain_wakeups()
+                else:
+                    self._receive(sock)
+
+    def _run_timers(self):
+        """Call the timers that are due, returns the time (in ms) until the
+        next one"""
+        while self._timers:
+            timer = self._timers[0]
+            if timer.cancelled:
+                heapq.heappop(self._timers)
+                continue
+            timeout = timer.deadline - time.monotonic()
+            if timeout > 0:
+                return timeout * 1000
+            heapq.heappop(self._timers)
+            self._call(timer.callback, *timer.args)
+        return None
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_in.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _receive(self, sock):
+        """Handle all the messages waiting on a socket"""
+        handler = self._handlers[sock]
+        while True:
+            try:
+                frames = sock.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self._call(handler, frames)
+
+    @staticmethod
+    def _call(callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.exception("Error in ZMQ reactor callback: {}".format(e))
@@ -31,37 +31,38 @@ Server used to connect to a Crazyflie using ZMQ.
 
 import sys
 import os
+import base64
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
 import logging
+import struct
+import re
 import signal
+import tempfile
+import time
+import numpy as np
 import zmq
-import queue
-from threading import Thread
+from collections import deque
+from numpy.lib import recfunctions
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from threading import Thread, Lock, Condition
 import cflib.crtp
 from cflib.crazyflie import Crazyflie
 from cflib.crazyflie.log import LogConfig
+from cflib.crazyflie.mem import MemoryElement
 
 import cfclient
+from cfclient.utils.periodictimer import PeriodicTimer
+from cfzmq.protocol import ZMQ_SRV_PORT, ZMQ_LOG_PORT, ZMQ_PARAM_PORT, \
+    ZMQ_CONN_PORT, ZMQ_CTRL_PORT, ZMQ_CRTP_PORT, CRTP_FRAME, CRTP_IN, \
+    CRTP_OUT, BINARY_TYPES, log_topic
+from cfzmq.shm import LogRing, HEADER_SIZE
 
-if os.name == 'posix':
-    print('Disabling standard output for libraries!')
-    stdout = os.dup(1)
-    os.dup2(os.open('/dev/null', os.O_WRONLY), 1)
-    sys.stdout = os.fdopen(stdout, 'w')
-
-# set SDL to use the dummy NULL video driver,
-#   so it doesn't need a windowing system.
-os.environ["SDL_VIDEODRIVER"] = "dummy"
-
-# Main command socket for control (ping/pong)
-ZMQ_SRV_PORT = 0
-# Log data socket (publish)
-ZMQ_LOG_PORT = 1
-# Param value updated (publish)
-ZMQ_PARAM_PORT = 2
-# Async event for connection, like connection lost (publish)
-ZMQ_CONN_PORT = 3
-# Control set-poins for Crazyflie (pull)
-ZMQ_CTRL_PORT = 4
+# Internal socket for passing responses back to the command thread
+_REPLY_ADDR = "inproc://cfzmq-replies"
 
 # Timeout before giving up when verifying param write
 PARAM_TIMEOUT = 2
@@ -69,69 +70,765 @@ PARAM_TIMEOUT = 2
 CONNECT_TIMEOUT = 5
 # Timeout before giving up adding/starting log config
 LOG_TIMEOUT = 10
+# Timeout before giving up a memory transfer, restarted for every chunk
+MEM_TIMEOUT = 5
+# Default size (in bytes) of the chunks memory transfers are split into
+MEM_CHUNK = 1024
+
+# Rate (in Hz) for sending set-points to the Crazyflies
+CTRL_RATE = 100
+# Set-points with timestamps older than this (in seconds) are dropped
+CTRL_MAX_AGE = 0.1
+
+# Set-point types accepted on the control socket, mapped to the commander
+# method and the fields passed as arguments to it
+_SETPOINT_TYPES = {
+    "rpyt": ("send_setpoint", ("roll", "pitch", "yaw", "thrust")),
+    "hover": ("send_hover_setpoint", ("vx", "vy", "yawrate", "zdistance")),
+    "velocity_world": ("send_velocity_world_setpoint",
+                       ("vx", "vy", "vz", "yawrate")),
+    "position": ("send_position_setpoint", ("x", "y", "z", "yaw")),
+    "stop": ("send_stop_setpoint", ()),
+}
+
+# Number of samples buffered for each recorded log configuration
+RECORD_BUFFER = 10000
+# Maximum number of samples returned when querying a recording
+RECORD_QUERY_LIMIT = 10000
+# Default number of samples in shared memory ring buffers
+SHM_CAPACITY = 10000
 
 logger = logging.getLogger(__name__)
 
 
-class _SrvThread(Thread):
+class _Stats():
+    """Counters and timings showing how the server behaves under load
 
-    def __init__(self, socket, log_socket, param_socket, conn_socket, cf,
-                 *args):
-        super(_SrvThread, self).__init__(*args)
+    Counters are addressed by a path (tuple of names) and are reported as
+    nested dictionaries. Gauges are functions called when taking a snapshot,
+    used for things like queue depths."""
+
+    # Upper limits (in ms) of the buckets in the command latency histograms
+    LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000,
+                       5000, 10000)
+
+    def __init__(self):
+        self._lock = Lock()
+        self._start = time.monotonic()
+        self._counters = {}
+        self._commands = {}
+        self._gauges = {}
+
+    def count(self, path, value=1):
+        with self._lock:
+            self._counters[path] = self._counters.get(path, 0) + value
+
+    def command_done(self, name, latency, handler_time):
+        """Record a completed command. The latency is the time until the
+        response was sent and handler_time the time the command thread was
+        busy handling the request (both in seconds)."""
+        bucket = bisect.bisect_left(self.LATENCY_BUCKETS, latency * 1000)
+        with self._lock:
+            cmd = self._commands.get(name)
+            if cmd is None:
+                cmd = {"count": 0, "total_time": 0.0, "max_time": 0.0,
+                       "handler_time": 0.0,
+                       "histogram": [0] * (len(self.LATENCY_BUCKETS) + 1)}
+                self._commands[name] = cmd
+            cmd["count"] += 1
+            cmd["total_time"] += latency
+            cmd["max_time"] = max(cmd["max_time"], latency)
+            cmd["handler_time"] += handler_time
+            cmd["histogram"][bucket] += 1
+
+    def add_gauge(self, name, gauge):
+        self._gauges[name] = gauge
+
+    def snapshot(self):
+        out = {"uptime": time.monotonic() - self._start,
+               "latency_buckets": list(self.LATENCY_BUCKETS)}
+        with self._lock:
+            counters = dict(self._counters)
+            out["commands"] = {name: dict(cmd, histogram=list(
+                cmd["histogram"])) for (name, cmd) in self._commands.items()}
+        for (path, value) in counters.items():
+            node = out
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            node[path[-1]] = value
+        for (name, gauge) in self._gauges.items():
+            out[name] = gauge()
+        return out
+
+
+class _Publisher():
+    """Thread safe wrapper around a ZMQ publish socket
+
+    Events are published from the cflib callbacks of all the connected
+    Crazyflies, so sending on the socket is serialized with a lock.
+
+    Messages are sent without blocking. A PUB socket silently drops messages
+    for subscribers that have reached the high-water mark, unless the socket
+    has XPUB_NODROP set. Then the send fails instead and the message is
+    dropped (for all subscribers) and counted here."""
+
+    def __init__(self, socket, name=None, stats=None):
         self._socket = socket
-        self._log_socket = log_socket
-        self._param_socket = param_socket
-        self._conn_socket = conn_socket
-        self._cf = cf
-
-        self._cf.connected.add_callback(self._connected)
-        self._cf.connection_failed.add_callback(self._connection_failed)
-        self._cf.connection_lost.add_callback(self._connection_lost)
-        self._cf.disconnected.add_callback(self._disconnected)
-        self._cf.connection_requested.add_callback(self._connection_requested)
-        self._cf.param.all_updated.add_callback(self._tocs_updated)
-        self._cf.param.all_update_callback.add_callback(self._all_param_update)
-
-        self._conn_queue = queue.Queue(1)
-        self._param_queue = queue.Queue(1)
-        self._log_started_queue = queue.Queue(1)
-        self._log_added_queue = queue.Queue(1)
+        self._lock = Lock()
+        self._stats = stats
+        self._messages_path = ("sockets", name, "messages")
+        self._bytes_path = ("sockets", name, "bytes")
+        self._dropped_path = ("sockets", name, "dropped")
+
+    def send_json(self, obj, topic=None):
+        """Publish a JSON message, prefixed by a topic frame if given"""
+        if topic is None:
+            self.send_multipart([json.dumps(obj).encode()])
+        else:
+            self.send_multipart([topic, json.dumps(obj).encode()])
+
+    def send_multipart(self, frames):
+        with self._lock:
+            self._send(frames)
+
+    def _send(self, frames):
+        try:
+            self._socket.send_multipart(frames, zmq.NOBLOCK)
+        except zmq.Again:
+            if self._stats:
+                self._stats.count(self._dropped_path)
+            return
+        if self._stats:
+            self._stats.count(self._messages_path)
+            self._stats.count(self._bytes_path, sum(len(f) for f in frames))
+
+
+class _LogSchema():
+    """Binary layout of the samples of one log configuration
+
+    Each sample is packed as a little-endian record of the timestamp
+    followed by the variables in the order they were added to the
+    configuration, so clients can decode them using np.frombuffer."""
+
+    def __init__(self, uri, conf, toc):
+        self.uri = uri
+        self.name = conf.name
+        self.period = conf.period_in_ms
+        self.names = [v.name for v in conf.variables]
+        self.ctypes = []
+        fmt = "<I"
+        self.dtype = [["timestamp", "<u4"]]
+        for name in self.names:
+            ctype = toc.get_element_by_complete_name(name).ctype
+            self.ctypes.append(ctype)
+            fmt += BINARY_TYPES[ctype][0]
+            self.dtype.append([name, BINARY_TYPES[ctype][1]])
+        self._struct = struct.Struct(fmt)
+        self.size = self._struct.size
+
+        self.message = {"version": 1, "uri": uri, "name": conf.name,
+                        "event": "schema", "encoding": "binary",
+                        "format": fmt, "size": self._struct.size,
+                        "dtype": self.dtype}
+        # Only the sequence number of the header of data messages changes,
+        # so encode the rest of it once
+        self._header = json.dumps({"version": 1, "uri": uri,
+                                   "name": conf.name, "event": "data",
+                                   "encoding": "binary"})[:-1].encode()
+
+    def data_header(self, seq):
+        return self._header + b', "seq": %d}' % seq
+
+    def pack(self, ts, data):
+        return self._struct.pack(ts, *[data[n] for n in self.names])
+
+    def unpack_all(self, data):
+        return self._struct.iter_unpack(data)
+
+    def record_header(self):
+        """Header written as the first line of recording files"""
+        return {"version": 1, "uri": self.uri, "name": self.name,
+                "period": self.period, "format": self._struct.format,
+                "size": self.size, "dtype": self.dtype,
+                "types": dict(zip(self.names, self.ctypes)),
+                "started": time.time()}
+
+
+class _CrtpTap():
+    """Publishes the CRTP packets sent to and received from the Crazyflies
+
+    Only packets passing the port/channel filter are published. The filter
+    is kept as a table with one entry for each port and channel, so checking
+    a packet is a lookup."""
+
+    def __init__(self, pub, stats, filters=None):
+        self._pub = pub
+        self._stats = stats
+        self.set_filter(filters or [])
+
+    def set_filter(self, filters):
+        """Set the filter from a list of {"port": p, "channel": c} entries,
+        channel can be left out to match all channels. An empty list lets
+        all packets through."""
+        table = [not filters] * 64
+        for f in filters:
+            port = int(f["port"])
+            channels = [int(f["channel"])] if f.get("channel") is not None \
+                else range(4)
+            if not 0 <= port < 16:
+                raise ValueError("Invalid CRTP port {}".format(port))
+            for channel in channels:
+                if not 0 <= channel < 4:
+                    raise ValueError("Invalid CRTP channel {}".format(
+                        channel))
+                table[port * 4 + channel] = True
+        self.filters = [dict(f) for f in filters]
+        self._table = table
+
+    def attach(self, cf, uri):
+        """Publish the packets of a Crazyflie, with the URI as topic"""
+        topic = uri.encode()
+        cf.packet_received.add_callback(
+            lambda pk: self._packet(topic, CRTP_IN, pk))
+        cf.packet_sent.add_callback(
+            lambda pk: self._packet(topic, CRTP_OUT, pk))
+
+    def _packet(self, topic, direction, pk):
+        if not self._table[(pk.port & 0x0F) * 4 + (pk.channel & 0x03)]:
+            self._stats.count(("crtp", "filtered"))
+            return
+        self._pub.send_multipart([topic, CRTP_FRAME.pack(
+            int(time.time() * 1000000), direction, pk.port, pk.channel) +
+            bytes(pk.data)])
+
+
+def _query_recording(f, data_start, schema, start, end, limit):
+    """Read the samples with timestamps in [start, end] from an open
+    recording file. Timestamps are increasing, so the first sample is found
+    using a binary search over the fixed size records."""
+    size = schema.size
+    f.seek(0, os.SEEK_END)
+    count = (f.tell() - data_start) // size
+
+    def _timestamp(index):
+        f.seek(data_start + index * size)
+        return struct.unpack("<I", f.read(4))[0]
+
+    low, high = 0, count
+    while low < high:
+        mid = (low + high) // 2
+        if _timestamp(mid) < start:
+            low = mid + 1
+        else:
+            high = mid
+
+    resp = {"version": 1, "status": 0, "uri": schema.uri,
+            "name": schema.name, "timestamps": [], "variables": {},
+            "truncated": False}
+    for name in schema.names:
+        resp["variables"][name] = []
+    f.seek(data_start + low * size)
+    data = f.read(min(count - low, limit + 1) * size)
+    for record in schema.unpack_all(data):
+        if record[0] > end:
+            break
+        if len(resp["timestamps"]) == limit:
+            resp["truncated"] = True
+            break
+        resp["timestamps"].append(record[0])
+        for (name, value) in zip(schema.names, record[1:]):
+            resp["variables"][name].append(value)
+    return resp
+
+
+class _Recorder(Thread):
+    """Appends the samples of a log configuration to a file
+
+    Samples are handed over in a bounded ring buffer and written by this
+    thread, so recording never blocks the cflib callbacks. If the disk
+    can't keep up the oldest samples in the buffer are dropped. Queries are
+    also handled by this thread, after everything before them is written.
+    If writing fails the recording is stopped and error is set."""
+
+    def __init__(self, path, schema, capacity, *args):
+        super(_Recorder, self).__init__(*args)
+        self.daemon = True
+        self.path = path
+        self.schema = schema
+        self.dropped = 0
+        self.error = None
+        self._capacity = capacity
+        self._buffer = deque()
+        self._queries = []
+        self._closing = False
+        self._cond = Condition()
+
+        self._file = open(path, "w+b")
+        self._file.write(json.dumps(schema.record_header()).encode() + b"\n")
+        self.data_start = self._file.tell()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def write(self, record):
+        with self._cond:
+            if self.error is not None:
+                self.dropped += 1
+                return
+            if len(self._buffer) >= self._capacity:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(record)
+            self._cond.notify()
+
+    def query(self, start, end, limit):
+        """Returns a Future of the response, the response if the recording
+        has failed or None if the recording is stopped"""
+        future = Future()
+        with self._cond:
+            if self.error is not None:
+                return self._failed_response()
+            if self._closing:
+                return None
+            self._queries.append((future, start, end, limit))
+            self._cond.notify()
+        return future
+
+    def stop(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def _failed_response(self):
+        return {"version": 1, "status": 3,
+                "msg": "Recording to {} failed: {}".format(self.path,
+                                                           self.error)}
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not (self._buffer or self._queries or self._closing):
+                    self._cond.wait()
+                records = list(self._buffer)
+                self._buffer.clear()
+                queries, self._queries = self._queries, []
+                stop = self._closing
+            try:
+                if records:
+                    self._file.seek(0, os.SEEK_END)
+                    self._file.write(b"".join(records))
+                    self._file.flush()
+                for (future, start, end, limit) in queries:
+                    future.set_result(_query_recording(
+                        self._file, self.data_start, self.schema, start, end,
+                        limit))
+            except Exception as e:
+                logger.exception("Recording to {} failed".format(self.path))
+                self._fail(e, queries)
+                break
+            if stop:
+                self._file.close()
+                break
+
+    def _fail(self, error, queries):
+        """Stop recording and answer the queries that are waiting"""
+        with self._cond:
+            self.error = str(error)
+            self._closing = True
+            self.dropped += len(self._buffer)
+            self._buffer.clear()
+            queries = queries + self._queries
+            self._queries = []
+        response = self._failed_response()
+        for (future, _, _, _) in queries:
+            _resolve(future, response)
+        try:
+            self._file.close()
+        except OSError:
+            pass
+
+
+class _LogBatch():
+    """Samples of a log configuration waiting to be published together
+
+    The batch is full when it holds the maximum number of samples or when the
+    newest sample is at least interval ms (Crazyflie time) newer than the
+    oldest one. A value of 0 disables that limit."""
+
+    def __init__(self, samples, interval):
+        self._max_samples = samples
+        self._interval = interval
+        self._lock = Lock()
+        self._timestamps = []
+        self._samples = []
+
+    def add(self, ts, sample):
+        """Add a sample, returns the batch content if it is now full"""
+        with self._lock:
+            self._timestamps.append(ts)
+            self._samples.append(sample)
+            if (self._max_samples and
+                    len(self._samples) >= self._max_samples) or \
+                    (self._interval and
+                     ts - self._timestamps[0] >= self._interval):
+                return self._take()
+        return None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def take(self):
+        """Return the timestamps and samples in the batch and empty it"""
+        with self._lock:
+            return self._take()
+
+    def _take(self):
+        content = (self._timestamps, self._samples)
+        self._timestamps = []
+        self._samples = []
+        return content
+
+
+class _DerivedStreams():
+    """Lower rate streams derived from the samples of a log configuration,
+    published next to the full rate stream.
+
+    The decimated stream passes on one sample every 1/rate seconds and the
+    aggregate stream summarizes each window of samples (in ms, Crazyflie
+    time) with the min, max, mean and standard deviation of every variable.
+    The samples of a window are kept packed and the summary is computed for
+    all variables at once using NumPy. A value of 0 disables that stream."""
+
+    def __init__(self, schema, rate, window):
+        self.schema = schema
+        self._period = 1000.0 / rate if rate else 0
+        self._window = window
+        self._dtype = np.dtype([tuple(d) for d in schema.dtype])
+        self._lock = Lock()
+        self._next_ts = None
+        self._window_start = None
+        self._records = []
+        self.header = json.dumps({"version": 1, "uri": schema.uri,
+                                  "name": schema.name, "event": "data",
+                                  "encoding": "binary",
+                                  "stream": "decimate"}).encode()
+
+    def add(self, ts, record):
+        """Add a sample, returns if it should be published on the decimated
+        stream and the summary of the window it completes (if any)"""
+        decimated = False
+        summary = None
+        with self._lock:
+            if self._period and (self._next_ts is None or
+                                 ts >= self._next_ts):
+                decimated = True
+                if self._next_ts is None:
+                    self._next_ts = ts
+                self._next_ts += self._period
+                # Don't try to catch up after a gap in the samples
+                if self._next_ts <= ts:
+                    self._next_ts = ts + self._period
+            if self._window:
+                if self._records and \
+                        ts - self._window_start >= self._window:
+                    summary = self._summarize()
+                if not self._records:
+                    self._window_start = ts
+                self._records.append(record)
+        return decimated, summary
+
+    def flush(self):
+        """Return the summary of the samples in the current window"""
+        with self._lock:
+            if self._records:
+                return self._summarize()
+        return None
+
+    def _summarize(self):
+        samples = np.frombuffer(b"".join(self._records), dtype=self._dtype)
+        self._records = []
+        values = recfunctions.structured_to_unstructured(
+            samples[self.schema.names], dtype=np.float64)
+        stats = {"min": values.min(axis=0), "max": values.max(axis=0),
+                 "mean": values.mean(axis=0), "std": values.std(axis=0)}
+        out = {"timestamps": [int(samples["timestamp"][0]),
+                              int(samples["timestamp"][-1])],
+               "count": len(samples), "variables": {}}
+        for (i, name) in enumerate(self.schema.names):
+            out["variables"][name] = {k: float(v[i])
+                                      for (k, v) in stats.items()}
+        return out
+
+
+class _MemTransfer():
+    """A memory read or write split into chunks. Progress is reported after
+    every chunk and the future is resolved with the response when the
+    transfer is done or fails."""
+
+    def __init__(self, action, mem, addr, total, chunk):
+        self.action = action
+        self.mem = mem
+        self.addr = addr
+        self.total = total
+        self.chunk = chunk
+        self.done = 0
+        self.data = bytearray()
+        self.future = Future()
+        self._timer = None
+
+    def watch(self, timeout, on_timeout):
+        """(Re)start the timeout for the next chunk"""
+        self.cancel_watch()
+        self._timer = _timeouts.call_later(timeout, on_timeout, self)
+
+    def cancel_watch(self):
+        if self._timer:
+            self._timer.cancel()
+
+
+class _Timeout():
+    """Function scheduled with _Timeouts.call_later, cancel() stops it from
+    being called"""
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+    def cancel(self):
+        # Drop the references, the entry is removed when it's due
+        self.callback = None
+        self.args = None
+
+
+class _Timeouts(Thread):
+    """One thread calling the timeouts of all pending operations, instead of
+    a Timer thread for each of them. The thread is started when the first
+    timeout is scheduled."""
+
+    def __init__(self):
+        super(_Timeouts, self).__init__(name="cfzmq-timeouts")
+        self.daemon = True
+        self._cond = Condition()
+        self._heap = []
+        self._running = False
+
+    def call_later(self, delay, callback, *args):
+        timeout = _Timeout(time.monotonic() + delay, callback, args)
+        with self._cond:
+            if not self._running:
+                self._running = True
+                self.start()
+            heapq.heappush(self._heap, timeout)
+            if self._heap[0] is timeout:
+                self._cond.notify()
+        return timeout
+
+    def run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0].deadline - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                timeout = heapq.heappop(self._heap)
+            (callback, args) = (timeout.callback, timeout.args)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("Timeout callback failed")
+
+
+_timeouts = _Timeouts()
+
+
+def _resolve(future, result):
+    """Complete a future unless it's already done. Operations race against
+    their timeouts, so the first one to finish wins."""
+    try:
+        future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def _expiring_future(timeout, timeout_response):
+    """Create a future that is resolved to timeout_response unless it's
+    completed within timeout seconds"""
+    future = Future()
+    timer = _timeouts.call_later(timeout, _resolve, future, timeout_response)
+    future.add_done_callback(lambda f: timer.cancel())
+    return future
+
+
+def _gather(items, combine):
+    """Create a future resolved with combine(results) once all the items,
+    which are responses or futures of responses, are completed"""
+    result = Future()
+    futures = [i for i in items if isinstance(i, Future)]
+    remaining = [len(futures)]
+    lock = Lock()
+
+    def _done(f):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        result.set_result(combine(
+            [i.result() if isinstance(i, Future) else i for i in items]))
+
+    if not futures:
+        result.set_result(combine(items))
+    for f in futures:
+        f.add_done_callback(_done)
+    return result
+
+
+def _then(future, fn):
+    """Create a future resolved with fn applied to the result of future"""
+    return _gather([future], lambda results: fn(results[0]))
+
+
+class _Vehicle():
+    """One Crazyflie handled by the server, identified by its URI
+
+    Operations that have to wait for the Crazyflie return a Future that is
+    resolved with the response from the cflib callbacks, so any number of
+    operations can be in flight at the same time."""
+
+    def __init__(self, uri, log_pub, param_pub, conn_pub, stats,
+                 ro_cache=None, record_dir=None, shm_dir=None,
+                 crtp_tap=None):
+        self.uri = uri
+        self._record_dir = record_dir
+        self._shm_dir = shm_dir
+        self._log_pub = log_pub
+        self._param_pub = param_pub
+        self._conn_pub = conn_pub
+        self._stats = stats
+
+        self.cf = self._create_crazyflie(ro_cache)
+        # Set while the link is open or being opened
+        self.linked = False
+
+        self.cf.connected.add_callback(self._connected)
+        self.cf.connection_failed.add_callback(self._connection_failed)
+        self.cf.connection_lost.add_callback(self._connection_lost)
+        self.cf.disconnected.add_callback(self._disconnected)
+        self.cf.connection_requested.add_callback(self._connection_requested)
+        self.cf.param.all_updated.add_callback(self._tocs_updated)
+        self.cf.param.all_update_callback.add_callback(self._all_param_update)
+        if crtp_tap:
+            crtp_tap.attach(self.cf, uri)
+
+        self._lock = Lock()
+        self._connect_future = None
+        self._tocs_ready = False
+        self._toc = None
+        self._log_added_waiters = {}
+        self._log_started_waiters = {}
+        self._param_waiters = {}
 
         self._logging_configs = {}
+        self._schemas = {}
+        self._batches = {}
+        self._topics = {}
+        self._recorders = {}
+        self._recordings = {}
+        self._rings = {}
+        self._derived = {}
+        self._log_seq = {}
+        self._mem_transfers = {}
+
+    def _create_crazyflie(self, ro_cache):
+        return Crazyflie(ro_cache=ro_cache,
+                         rw_cache=cfclient.config_path + "/cache")
+
+    def _create_log_config(self, name, period):
+        return LogConfig(name, period)
+
+    def _topic(self, name, stream="raw"):
+        """Topic for the log messages of a configuration"""
+        topic = self._topics.get((name, stream))
+        if topic is None:
+            topic = log_topic(self.uri, name, stream)
+            self._topics[(name, stream)] = topic
+        return topic
+
+    def queue_depths(self):
+        with self._lock:
+            return {"connecting": 1 if self._connect_future else 0,
+                    "log_waiters": len(self._log_added_waiters) +
+                    len(self._log_started_waiters),
+                    "param_waiters": sum(len(w) for w in
+                                         self._param_waiters.values()),
+                    "batched_samples": sum(len(b) for b in
+                                           list(self._batches.values())),
+                    "record_backlog": sum(len(r) for r in
+                                          list(self._recorders.values())),
+                    "record_dropped": sum(r.dropped for r in
+                                          list(self._recordings.values())),
+                    "mem_transfers": len(self._mem_transfers)}
 
     def _connection_requested(self, uri):
         conn_ev = {"version": 1, "event": "requested", "uri": uri}
-        self._conn_socket.send_json(conn_ev)
+        self._conn_pub.send_json(conn_ev)
 
     def _connected(self, uri):
         conn_ev = {"version": 1, "event": "connected", "uri": uri}
-        self._conn_socket.send_json(conn_ev)
+        self._conn_pub.send_json(conn_ev)
 
     def _connection_failed(self, uri, msg):
         logger.info("Connection failed to {}: {}".format(uri, msg))
+        self.linked = False
         resp = {"version": 1, "status": 1, "msg": msg}
-        self._conn_queue.put_nowait(resp)
+        with self._lock:
+            future, self._connect_future = self._connect_future, None
+        if future:
+            _resolve(future, resp)
         conn_ev = {"version": 1, "event": "failed", "uri": uri, "msg": msg}
-        self._conn_socket.send_json(conn_ev)
+        self._conn_pub.send_json(conn_ev)
 
     def _connection_lost(self, uri, msg):
+        self._tocs_ready = False
         conn_ev = {"version": 1, "event": "lost", "uri": uri, "msg": msg}
-        self._conn_socket.send_json(conn_ev)
+        self._conn_pub.send_json(conn_ev)
 
     def _disconnected(self, uri):
+        self.linked = False
+        self._tocs_ready = False
+        # The log configurations are gone from the Crazyflie, but their
+        # recordings can still be queried
+        for name in list(self._logging_configs.keys()):
+            self._log_deleted(name)
+        self._logging_configs.clear()
+        for transfer in list(self._mem_transfers.values()):
+            self._mem_finish(transfer, {"version": 1, "status": 3,
+                                        "msg": "Disconnected"})
         conn_ev = {"version": 1, "event": "disconnected", "uri": uri}
-        self._conn_socket.send_json(conn_ev)
+        self._conn_pub.send_json(conn_ev)
 
-    def _tocs_updated(self):
+    def _build_toc(self):
+        """Build the TOC description and its hash. The hash only covers the
+        TOC itself and not the parameter values, so it only changes when
+        the firmware does."""
         # First do the log
-        log_toc = self._cf.log.toc.toc
+        log_toc = self.cf.log.toc.toc
         log = {}
         for group in log_toc:
             log[group] = {}
             for name in log_toc[group]:
                 log[group][name] = {"type": log_toc[group][name].ctype}
         # The the params
-        param_toc = self._cf.param.toc.toc
+        param_toc = self.cf.param.toc.toc
         param = {}
         for group in param_toc:
             param[group] = {}
@@ -139,196 +836,1017 @@ class _SrvThread(Thread):
                 param[group][name] = {
                     "type": param_toc[group][name].ctype,
                     "access": "RW" if param_toc[group][
-                        name].access == 0 else "RO",
-                    "value": self._cf.param.values[group][name]}
+                        name].access == 0 else "RO"}
 
-        resp = {"version": 1, "status": 0, "log": log, "param": param}
-        self._conn_queue.put_nowait(resp)
+        toc_hash = hashlib.sha1(json.dumps([log, param],
+                                           sort_keys=True).encode())
+        self._toc = (toc_hash.hexdigest(), log, param)
 
-    def _handle_scanning(self):
-        resp = {"version": 1}
-        interfaces = cflib.crtp.scan_interfaces()
-        resp["interfaces"] = []
-        for i in interfaces:
-            resp["interfaces"].append({"uri": i[0], "info": i[1]})
-        return resp
+    def _toc_response(self):
+        (toc_hash, log, param_toc) = self._toc
+        values = self.cf.param.values
+        param = {}
+        for group in param_toc:
+            param[group] = {}
+            for name in param_toc[group]:
+                param[group][name] = dict(param_toc[group][name],
+                                          value=values[group][name])
+
+        return {"version": 1, "status": 0, "uri": self.uri,
+                "toc_hash": toc_hash, "log": log, "param": param}
+
+    def handle_get_toc(self, data):
+        if not self._tocs_ready:
+            return {"version": 1, "status": 1,
+                    "msg": "TOCs not downloaded yet"}
+        return self._toc_response()
+
+    def _tocs_updated(self):
+        self._build_toc()
+        self._tocs_ready = True
+        with self._lock:
+            future, self._connect_future = self._connect_future, None
+        if future:
+            _resolve(future, self._toc_response())
+
+    def connect(self, executor):
+        """Connect to the Crazyflie, the future is resolved once the TOCs
+        are downloaded. Clients connecting to a Crazyflie that is already
+        connected (or connecting) share the same connection. Opening the
+        link blocks, so it's done by the executor."""
+        with self._lock:
+            if self._connect_future:
+                return self._connect_future
+            if self._tocs_ready:
+                future = Future()
+                future.set_result(self._toc_response())
+                return future
+            future = self._connect_future = Future()
+        self.linked = True
+        executor.submit(self.cf.open_link, self.uri).add_done_callback(
+            self._link_opened)
+        return future
+
+    def _link_opened(self, opened):
+        if opened.exception():
+            self._connection_failed(self.uri, str(opened.exception()))
+
+    def disconnect(self):
+        self.cf.close_link()
 
-    def _handle_connect(self, uri):
-        self._cf.open_link(uri)
-        return self._conn_queue.get(block=True)
+    def _expect(self, waiters, name, timeout, timeout_response, on_event):
+        """Wait for a cflib event for the log configuration name, the returned
+        future is resolved with the response built by on_event"""
+        future = _expiring_future(timeout, timeout_response)
+        with self._lock:
+            waiters[name] = (future, on_event)
+        return future
+
+    def _event(self, waiters, name, value):
+        with self._lock:
+            waiter = waiters.pop(name, None)
+        if waiter:
+            _resolve(waiter[0], waiter[1](value))
 
     def _logging_started(self, conf, started):
-        out = {"version": 1, "name": conf.name}
+        out = {"version": 1, "uri": self.uri, "name": conf.name}
         if started:
             out["event"] = "started"
         else:
             out["event"] = "stopped"
-        self._log_socket.send_json(out)
-        self._log_started_queue.put_nowait(started)
+        self._log_pub.send_json(out, self._topic(conf.name))
+        self._event(self._log_started_waiters, conf.name, started)
 
     def _logging_added(self, conf, added):
-        out = {"version": 1, "name": conf.name}
+        out = {"version": 1, "uri": self.uri, "name": conf.name}
         if added:
             out["event"] = "created"
         else:
             out["event"] = "deleted"
-        self._log_socket.send_json(out)
-        self._log_added_queue.put_nowait(added)
+        self._log_pub.send_json(out, self._topic(conf.name))
+        self._event(self._log_added_waiters, conf.name, added)
 
-    def _handle_logging(self, data):
-        resp = {"version": 1}
+    def handle_logging(self, data):
+        """Handle a log command, returns the response or a Future of it"""
         if data["action"] == "create":
-            lg = LogConfig(data["name"], data["period"])
-            for v in data["variables"]:
-                lg.add_variable(v)
-            lg.started_cb.add_callback(self._logging_started)
-            lg.added_cb.add_callback(self._logging_added)
-            try:
-                lg.data_received_cb.add_callback(self._logdata_callback)
-                self._logging_configs[data["name"]] = lg
-                self._cf.log.add_config(lg)
-                lg.create()
-                self._log_added_queue.get(block=True, timeout=LOG_TIMEOUT)
-                resp["status"] = 0
-            except KeyError as e:
-                resp["status"] = 1
-                resp["msg"] = str(e)
-            except AttributeError as e:
-                resp["status"] = 2
-                resp["msg"] = str(e)
-            except queue.Empty:
-                resp["status"] = 3
-                resp["msg"] = "Log configuration did not start"
+            return self._log_create(data)
+        if data["action"] == "query":
+            return self._log_query(data["name"], data.get("start", 0),
+                                   data.get("end", 0xFFFFFFFF),
+                                   data.get("limit", RECORD_QUERY_LIMIT))
+        resp = {"version": 1}
+        if data["name"] not in self._logging_configs:
+            resp["status"] = 1
+            resp["msg"] = "'{}' config not found".format(data["name"])
+            return resp
+        lg = self._logging_configs[data["name"]]
+        if data["action"] == "record":
+            return self._log_record(lg, data.get("enabled", True))
+        if data["action"] == "share":
+            return self._log_share(lg, data.get("enabled", True),
+                                   data.get("capacity", SHM_CAPACITY))
         if data["action"] == "start":
-            try:
-                self._logging_configs[data["name"]].start()
-                self._log_started_queue.get(block=True, timeout=LOG_TIMEOUT)
-                resp["status"] = 0
-            except KeyError as e:
-                resp["status"] = 1
-                resp["msg"] = "{} config not found".format(str(e))
-            except queue.Empty:
-                resp["status"] = 2
-                resp["msg"] = "Log configuration did not stop"
+            future = self._expect(self._log_started_waiters, lg.name,
+                                  LOG_TIMEOUT,
+                                  {"version": 1, "status": 2,
+                                   "msg": "Log configuration did not start"},
+                                  lambda started: {"version": 1, "status": 0})
+            lg.start()
+            return future
         if data["action"] == "stop":
-            try:
-                self._logging_configs[data["name"]].stop()
-                self._log_started_queue.get(block=True, timeout=LOG_TIMEOUT)
-                resp["status"] = 0
-            except KeyError as e:
-                resp["status"] = 1
-                resp["msg"] = "{} config not found".format(str(e))
-            except queue.Empty:
-                resp["status"] = 2
-                resp["msg"] = "Log configuration did not stop"
+            future = self._expect(self._log_started_waiters, lg.name,
+                                  LOG_TIMEOUT,
+                                  {"version": 1, "status": 2,
+                                   "msg": "Log configuration did not stop"},
+                                  lambda started: self._log_stopped(lg.name))
+            lg.stop()
+            return future
         if data["action"] == "delete":
-            try:
-                self._logging_configs[data["name"]].delete()
-                self._log_added_queue.get(block=True, timeout=LOG_TIMEOUT)
-                resp["status"] = 0
-            except KeyError as e:
-                resp["status"] = 1
-                resp["msg"] = "{} config not found".format(str(e))
-            except queue.Empty:
-                resp["status"] = 2
-                resp["msg"] = "Log configuration did not stop"
-
+            future = self._expect(self._log_added_waiters, lg.name,
+                                  LOG_TIMEOUT,
+                                  {"version": 1, "status": 2,
+                                   "msg": "Log configuration did not delete"},
+                                  lambda added: self._log_deleted(lg.name))
+            lg.delete()
+            return future
+        resp["status"] = 0xFF
+        resp["msg"] = "Unknown log action {}".format(data["action"])
         return resp
 
-    def _handle_param(self, data):
+    def _log_create(self, data):
         resp = {"version": 1}
-        group = data["name"].split(".")[0]
-        name = data["name"].split(".")[1]
-        self._cf.param.add_update_callback(group=group, name=name,
-                                           cb=self._param_callback)
+        encoding = data.get("encoding", "json")
+        if encoding not in ("json", "binary"):
+            resp["status"] = 4
+            resp["msg"] = "Unknown encoding {}".format(encoding)
+            return resp
+        batch = None
+        if "batch" in data:
+            samples = data["batch"].get("samples", 0)
+            interval = data["batch"].get("interval", 0)
+            if samples < 0 or interval < 0 or \
+                    (samples == 0 and interval == 0):
+                resp["status"] = 5
+                resp["msg"] = "Invalid batch settings"
+                return resp
+            batch = _LogBatch(samples, interval)
+        derived = None
+        if "derived" in data:
+            derived = (data["derived"].get("decimate", 0),
+                       data["derived"].get("aggregate", 0))
+            if derived[0] < 0 or derived[1] < 0 or derived == (0, 0):
+                resp["status"] = 6
+                resp["msg"] = "Invalid derived stream settings"
+                return resp
+        lg = self._create_log_config(data["name"], data["period"])
+        for v in data["variables"]:
+            lg.add_variable(v)
+        lg.started_cb.add_callback(self._logging_started)
+        lg.added_cb.add_callback(self._logging_added)
         try:
-            self._cf.param.set_value(data["name"], str(data["value"]))
-            answer = self._param_queue.get(block=True, timeout=PARAM_TIMEOUT)
-            resp["name"] = answer["name"]
-            resp["value"] = answer["value"]
-            resp["status"] = 0
+            lg.data_received_cb.add_callback(self._logdata_callback)
+            self._logging_configs[data["name"]] = lg
+            self.cf.log.add_config(lg)
+            future = self._expect(self._log_added_waiters, lg.name,
+                                  LOG_TIMEOUT,
+                                  {"version": 1, "status": 3,
+                                   "msg": "Log configuration did not start"},
+                                  lambda added: self._log_created(
+                                      lg, encoding, batch, derived))
+            lg.create()
+            return future
         except KeyError as e:
             resp["status"] = 1
             resp["msg"] = str(e)
         except AttributeError as e:
             resp["status"] = 2
             resp["msg"] = str(e)
-        except queue.Empty:
-            resp["status"] = 3
-            resp["msg"] = "Timeout when setting parameter" \
-                          "{}".format(data["name"])
         return resp
 
+    def _log_created(self, lg, encoding, batch, derived):
+        resp = {"version": 1, "status": 0}
+        self._log_seq[lg.name] = itertools.count()
+        schema = None
+        if encoding == "binary":
+            schema = _LogSchema(self.uri, lg, self.cf.log.toc)
+            self._schemas[lg.name] = schema
+            self._log_pub.send_json(schema.message, self._topic(lg.name))
+            resp["schema"] = schema.message
+        if batch is not None:
+            self._batches[lg.name] = batch
+        if derived:
+            self._derived[lg.name] = _DerivedStreams(
+                schema or _LogSchema(self.uri, lg, self.cf.log.toc),
+                *derived)
+        return resp
+
+    def _log_stopped(self, name):
+        self._flush_batch(name)
+        self._flush_derived(name)
+        return {"version": 1, "status": 0}
+
+    def _log_record(self, lg, enabled):
+        if not enabled:
+            self._stop_recording(lg.name)
+            return {"version": 1, "status": 0}
+        if lg.name in self._recorders:
+            return {"version": 1, "status": 0,
+                    "path": self._recorders[lg.name].path}
+        if not lg.valid:
+            return {"version": 1, "status": 2,
+                    "msg": "'{}' config not created".format(lg.name)}
+        schema = self._schemas.get(lg.name)
+        if not schema:
+            schema = _LogSchema(self.uri, lg, self.cf.log.toc)
+        try:
+            os.makedirs(self._record_dir, exist_ok=True)
+            filename = re.sub(r"[^\w.-]+", "_", "{}-{}-{}.cfrec".format(
+                self.uri, lg.name, time.strftime("%Y%m%dT%H-%M-%S")))
+            recorder = _Recorder(os.path.join(self._record_dir, filename),
+                                 schema, RECORD_BUFFER)
+        except OSError as e:
+            return {"version": 1, "status": 3, "msg": str(e)}
+        recorder.start()
+        self._recordings[lg.name] = recorder
+        self._recorders[lg.name] = recorder
+        logger.info("Recording {} to {}".format(lg.name, recorder.path))
+        return {"version": 1, "status": 0, "path": recorder.path}
+
+    def _log_share(self, lg, enabled, capacity):
+        if not enabled:
+            self._stop_sharing(lg.name)
+            return {"version": 1, "status": 0}
+        if lg.name in self._rings:
+            return {"version": 1, "status": 0,
+                    "shm": self._rings[lg.name][2]}
+        if not lg.valid:
+            return {"version": 1, "status": 2,
+                    "msg": "'{}' config not created".format(lg.name)}
+        if capacity <= 0:
+            return {"version": 1, "status": 4,
+                    "msg": "Invalid capacity {}".format(capacity)}
+        schema = self._schemas.get(lg.name)
+        if not schema:
+            schema = _LogSchema(self.uri, lg, self.cf.log.toc)
+        try:
+            os.makedirs(self._shm_dir, exist_ok=True)
+            filename = re.sub(r"[^\w.-]+", "_", "cfzmq-{}-{}-{}.ring".format(
+                os.getpid(), self.uri, lg.name))
+            ring = LogRing(os.path.join(self._shm_dir, filename),
+                           schema.size, capacity)
+        except OSError as e:
+            return {"version": 1, "status": 3, "msg": str(e)}
+        info = {"path": ring.path, "capacity": capacity,
+                "offset": HEADER_SIZE, "size": schema.size,
+                "format": schema.message["format"], "dtype": schema.dtype}
+        self._rings[lg.name] = (ring, schema, info)
+        logger.info("Sharing {} in {}".format(lg.name, ring.path))
+        self._log_pub.send_json({"version": 1, "uri": self.uri,
+                                 "name": lg.name, "event": "shm",
+                                 "enabled": True, "shm": info},
+                                self._topic(lg.name))
+        return {"version": 1, "status": 0, "shm": info}
+
+    def _stop_sharing(self, name):
+        shared = self._rings.pop(name, None)
+        if shared:
+            shared[0].close()
+            self._log_pub.send_json({"version": 1, "uri": self.uri,
+                                     "name": name, "event": "shm",
+                                     "enabled": False},
+                                    self._topic(name))
+
+    def _stop_recording(self, name):
+        recorder = self._recorders.pop(name, None)
+        if recorder is not None:
+            recorder.stop()
+
+    def _log_query(self, name, start, end, limit):
+        recorder = self._recordings.get(name)
+        if recorder is None:
+            return {"version": 1, "status": 2,
+                    "msg": "'{}' has not been recorded".format(name)}
+        response = recorder.query(start, end, limit)
+        if response is not None:
+            return response
+        # The recording is stopped, read the closed file directly
+        with open(recorder.path, "rb") as f:
+            return _query_recording(f, recorder.data_start, recorder.schema,
+                                    start, end, limit)
+
+    def _log_deleted(self, name):
+        self._stop_recording(name)
+        self._stop_sharing(name)
+        self._flush_batch(name)
+        self._flush_derived(name)
+        self._batches.pop(name, None)
+        self._derived.pop(name, None)
+        self._schemas.pop(name, None)
+        self._log_seq.pop(name, None)
+        return {"version": 1, "status": 0}
+
+    def handle_mem(self, data):
+        """Handle a memory command, returns the response or a Future of it"""
+        if data["action"] == "list":
+            return {"version": 1, "status": 0, "memories": [
+                {"mem_id": m.id, "type": m.type,
+                 "type_name": MemoryElement.type_to_string(m.type),
+                 "size": m.size} for m in self.cf.mem.mems]}
+        if data["action"] not in ("read", "write"):
+            return {"version": 1, "status": 0xFF,
+                    "msg": "Unknown mem action {}".format(data["action"])}
+        mem = self.cf.mem.get_mem(data["mem_id"])
+        if not mem:
+            return {"version": 1, "status": 1,
+                    "msg": "No memory with id {}".format(data["mem_id"])}
+        addr = data.get("addr", 0)
+        chunk = data.get("chunk", MEM_CHUNK)
+        if data["action"] == "read":
+            content = None
+            total = data["length"]
+        else:
+            content = base64.b64decode(data["data"])
+            total = len(content)
+        if addr < 0 or total <= 0 or chunk <= 0 or addr + total > mem.size:
+            return {"version": 1, "status": 5,
+                    "msg": "Invalid address, length or chunk size"}
+        with self._lock:
+            if mem.id in self._mem_transfers:
+                return {"version": 1, "status": 4,
+                        "msg": "Memory {} is busy".format(mem.id)}
+            transfer = _MemTransfer(data["action"], mem, addr, total, chunk)
+            self._mem_transfers[mem.id] = transfer
+        if content is None:
+            self.cf.mem.mem_read_cb.add_callback(self._mem_read)
+            self.cf.mem.mem_read_failed_cb.add_callback(self._mem_failed)
+            self._mem_read_chunk(transfer)
+        else:
+            self.cf.mem.mem_write_cb.add_callback(self._mem_written)
+            self.cf.mem.mem_write_failed_cb.add_callback(self._mem_failed)
+            transfer.watch(MEM_TIMEOUT, self._mem_timeout)
+            # cflib queues the writes of a memory and sends the next as soon
+            # as the previous is confirmed, so all chunks are queued at once
+            for offset in range(0, total, chunk):
+                self.cf.mem.write(mem, addr + offset,
+                                  content[offset:offset + chunk])
+        return transfer.future
+
+    def _mem_read_chunk(self, transfer):
+        transfer.watch(MEM_TIMEOUT, self._mem_timeout)
+        length = min(transfer.chunk, transfer.total - transfer.done)
+        if not self.cf.mem.read(transfer.mem, transfer.addr + transfer.done,
+                                length):
+            self._mem_finish(transfer, {
+                "version": 1, "status": 4,
+                "msg": "Memory {} is busy".format(transfer.mem.id)})
+
+    def _mem_progress(self, transfer):
+        self._conn_pub.send_json({"version": 1, "event": "mem_progress",
+                                  "uri": self.uri,
+                                  "mem_id": transfer.mem.id,
+                                  "action": transfer.action,
+                                  "done": transfer.done,
+                                  "total": transfer.total})
+
+    def _mem_read(self, mem, addr, data):
+        transfer = self._mem_transfers.get(mem.id)
+        if not transfer or transfer.action != "read" or \
+                addr != transfer.addr + transfer.done:
+            return
+        transfer.data += data
+        transfer.done += len(data)
+        self._mem_progress(transfer)
+        if transfer.done < transfer.total:
+            self._mem_read_chunk(transfer)
+            return
+        self._mem_finish(transfer, {
+            "version": 1, "status": 0, "mem_id": mem.id,
+            "addr": transfer.addr,
+            "data": base64.b64encode(bytes(transfer.data)).decode()})
+
+    def _mem_written(self, mem, addr):
+        transfer = self._mem_transfers.get(mem.id)
+        if not transfer or transfer.action != "write":
+            return
+        transfer.done += min(transfer.chunk,
+                             transfer.total - (addr - transfer.addr))
+        self._mem_progress(transfer)
+        if transfer.done < transfer.total:
+            transfer.watch(MEM_TIMEOUT, self._mem_timeout)
+            return
+        self._mem_finish(transfer, {"version": 1, "status": 0,
+                                    "mem_id": mem.id})
+
+    def _mem_failed(self, mem, addr, *args):
+        transfer = self._mem_transfers.get(mem.id)
+        if transfer:
+            self._mem_finish(transfer, {
+                "version": 1, "status": 3,
+                "msg": "Memory {} failed at 0x{:X}".format(mem.id, addr)})
+
+    def _mem_timeout(self, transfer):
+        self._mem_finish(transfer, {
+            "version": 1, "status": 2,
+            "msg": "Timeout after {} of {} bytes".format(transfer.done,
+                                                         transfer.total)})
+
+    def _mem_finish(self, transfer, resp):
+        with self._lock:
+            if self._mem_transfers.get(transfer.mem.id) is not transfer:
+                return
+            del self._mem_transfers[transfer.mem.id]
+        transfer.cancel_watch()
+        _resolve(transfer.future, resp)
+
+    def handle_param(self, data, executor):
+        """Set a parameter, returns a Future of the response. The write is
+        sent by the executor since cflib blocks until the params are
+        initialized."""
+        return self._param_set(data["name"], data["value"], executor)
+
+    def handle_param_bulk_set(self, data, executor):
+        """Set many parameters without waiting for each confirmation before
+        sending the next write"""
+        names = list(data["params"].keys())
+        return _gather([self._param_set(n, data["params"][n], executor)
+                        for n in names],
+                       lambda results: self._bulk_response(names, results))
+
+    def handle_param_bulk_get(self, data):
+        """Request updated values for many parameters at the same time"""
+        names = data["names"]
+        return _gather([self._param_get(n) for n in names],
+                       lambda results: self._bulk_response(names, results))
+
+    @staticmethod
+    def _bulk_response(names, results):
+        resp = {"version": 1, "status": 0, "params": {}}
+        for (name, result) in zip(names, results):
+            result = dict(result)
+            result.pop("version", None)
+            result.pop("name", None)
+            resp["params"][name] = result
+            if result["status"] != 0:
+                resp["status"] = 1
+                resp["msg"] = "One or more parameters failed"
+        return resp
+
+    def _wait_for_param(self, name, timeout_msg):
+        future = _expiring_future(PARAM_TIMEOUT,
+                                  {"version": 1, "status": 3,
+                                   "msg": "{} {}".format(timeout_msg, name)})
+        with self._lock:
+            self._param_waiters.setdefault(name, []).append(future)
+        return future
+
+    def _cancel_param_wait(self, name, future, resp):
+        with self._lock:
+            waiters = self._param_waiters.get(name, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._param_waiters.pop(name, None)
+        _resolve(future, resp)
+
+    def _param_set(self, name, value, executor):
+        future = self._wait_for_param(name, "Timeout when setting parameter")
+        executor.submit(self._param_write, name, value, future)
+        return future
+
+    def _param_write(self, name, value, future):
+        resp = {"version": 1}
+        try:
+            self.cf.param.set_value(name, str(value))
+            return
+        except KeyError as e:
+            resp["status"] = 1
+            resp["msg"] = str(e)
+        except AttributeError as e:
+            resp["status"] = 2
+            resp["msg"] = str(e)
+        except Exception as e:
+            # cflib converts and packs the value for the parameter type
+            resp["status"] = 4
+            resp["msg"] = "Could not set {}: {}".format(name, e)
+        self._cancel_param_wait(name, future, resp)
+
+    def _param_get(self, name):
+        if not self.cf.param.toc.get_element_by_complete_name(name):
+            return {"version": 1, "status": 1,
+                    "msg": "Could not find {} in TOC".format(name)}
+        future = self._wait_for_param(name, "Timeout when reading parameter")
+        self.cf.param.request_param_update(name)
+        return future
+
     def _all_param_update(self, name, value):
-        resp = {"version": 1, "name": name, "value": value}
-        self._param_socket.send_json(resp)
+        resp = {"version": 1, "uri": self.uri, "name": name, "value": value}
+        self._param_pub.send_json(resp)
+        with self._lock:
+            waiters = self._param_waiters.pop(name, [])
+        for future in waiters:
+            _resolve(future, {"version": 1, "status": 0,
+                              "name": name, "value": value})
+
+    def _next_seq(self, name):
+        """Sequence number of the next data message of a log configuration,
+        so subscribers can detect messages they missed"""
+        return next(self._log_seq.setdefault(name, itertools.count()))
+
+    def _flush_batch(self, name):
+        batch = self._batches.get(name)
+        if batch is not None:
+            self._publish_batch(name, batch.take())
+
+    def _publish_batch(self, name, content):
+        timestamps, samples = content
+        if not timestamps:
+            return
+        self._stats.count(("log", self.uri, name, "messages"))
+        self._stats.count(("log", self.uri, name, "samples"), len(samples))
+        seq = self._next_seq(name)
+        schema = self._schemas.get(name)
+        if schema:
+            self._log_pub.send_multipart([self._topic(name),
+                                          schema.data_header(seq),
+                                          b"".join(samples)])
+            return
+        out = {"version": 1, "uri": self.uri, "name": name,
+               "event": "batch", "seq": seq, "timestamps": timestamps,
+               "variables": {}}
+        for d in samples[0]:
+            out["variables"][d] = [sample[d] for sample in samples]
+        self._log_pub.send_json(out, self._topic(name))
+
+    def _flush_derived(self, name):
+        derived = self._derived.get(name)
+        if derived is not None:
+            summary = derived.flush()
+            if summary:
+                self._publish_aggregate(name, summary)
+
+    def _publish_aggregate(self, name, summary):
+        self._stats.count(("log", self.uri, name, "derived_messages"))
+        out = {"version": 1, "uri": self.uri, "name": name,
+               "event": "aggregate", "stream": "aggregate"}
+        out.update(summary)
+        self._log_pub.send_json(out, self._topic(name, "aggregate"))
 
-    def _param_callback(self, name, value):
-        group = name.split(".")[0]
-        name_short = name.split(".")[1]
-        self._cf.param.remove_update_callback(group=group, name=name_short)
-        self._param_queue.put_nowait({"name": name, "value": value})
+    def _publish_derived(self, name, derived, ts, data, record):
+        (decimated, summary) = derived.add(ts, record)
+        if decimated:
+            self._stats.count(("log", self.uri, name, "derived_messages"))
+            topic = self._topic(name, "decimate")
+            if name in self._schemas:
+                self._log_pub.send_multipart([topic, derived.header, record])
+            else:
+                self._log_pub.send_json({"version": 1, "uri": self.uri,
+                                         "name": name, "event": "data",
+                                         "stream": "decimate",
+                                         "timestamp": ts,
+                                         "variables": dict(data)}, topic)
+        if summary:
+            self._publish_aggregate(name, summary)
 
     def _logdata_callback(self, ts, data, conf):
-        out = {"version": 1, "name": conf.name, "event": "data",
-               "timestamp": ts, "variables": {}}
+        schema = self._schemas.get(conf.name)
+        batch = self._batches.get(conf.name)
+        recorder = self._recorders.get(conf.name)
+        shared = self._rings.get(conf.name)
+        derived = self._derived.get(conf.name)
+        record = None
+        if recorder is not None:
+            record = recorder.schema.pack(ts, data)
+            recorder.write(record)
+        if shared:
+            if record is None:
+                record = shared[1].pack(ts, data)
+            shared[0].write(record)
+        if derived is not None:
+            if record is None:
+                record = derived.schema.pack(ts, data)
+            self._publish_derived(conf.name, derived, ts, data, record)
+        if schema and record is None:
+            record = schema.pack(ts, data)
+        if batch is not None:
+            content = batch.add(ts, record if schema else data)
+            if content:
+                self._publish_batch(conf.name, content)
+            return
+        self._stats.count(("log", self.uri, conf.name, "messages"))
+        self._stats.count(("log", self.uri, conf.name, "samples"))
+        seq = self._next_seq(conf.name)
+        if schema:
+            self._log_pub.send_multipart([self._topic(conf.name),
+                                          schema.data_header(seq), record])
+            return
+        out = {"version": 1, "uri": self.uri, "name": conf.name,
+               "event": "data", "seq": seq, "timestamp": ts,
+               "variables": {}}
         for d in data:
             out["variables"][d] = data[d]
-        self._log_socket.send_json(out)
+        self._log_pub.send_json(out, self._topic(conf.name))
+
+
+class _Fleet():
+    """All the Crazyflies handled by the server, keyed by URI"""
+
+    def __init__(self):
+        self._vehicles = {}
+        self._lock = Lock()
+
+    def get(self, uri):
+        with self._lock:
+            return self._vehicles.get(uri)
+
+    def add(self, vehicle):
+        with self._lock:
+            self._vehicles[vehicle.uri] = vehicle
+
+    def all(self):
+        with self._lock:
+            return list(self._vehicles.values())
+
+    def find(self, msg):
+        """Return the vehicle addressed by a message. If the message has no
+        URI and only one vehicle is connected, that vehicle is used so single
+        Crazyflie clients do not have to include the URI."""
+        with self._lock:
+            if "uri" in msg:
+                return self._vehicles.get(msg["uri"])
+            linked = [v for v in self._vehicles.values() if v.linked]
+            if len(linked) == 1:
+                return linked[0]
+        return None
+
+
+class _CommandHandler():
+    """Handles the commands sent to the server. Commands that have to wait
+    for a Crazyflie are answered with a Future of the response."""
+
+    def __init__(self, fleet, log_pub, param_pub, conn_pub, stats,
+                 ro_cache=None, record_dir=None, vehicle_factory=None,
+                 scan=None, shm_dir=None, crtp_tap=None):
+        self._fleet = fleet
+        self._vehicle_factory = vehicle_factory or _Vehicle
+        self._scan = scan or cflib.crtp.scan_interfaces
+        self._stats = stats
+        self._ro_cache = ro_cache
+        self._record_dir = record_dir
+        self._shm_dir = shm_dir
+        self._crtp_tap = crtp_tap
+        self._log_pub = log_pub
+        self._param_pub = param_pub
+        self._conn_pub = conn_pub
+        # Scanning uses the radio, so only one scan is done at a time
+        self._scan_executor = ThreadPoolExecutor(max_workers=1)
+        # Opening and closing links blocks (opening the radio, joining the
+        # cflib threads), so it's done in order on a thread of its own
+        self._link_executor = ThreadPoolExecutor(max_workers=1)
+        # Param writes block until the params of the Crazyflie are
+        # initialized, they are sent in order on a thread of their own
+        self._param_executor = ThreadPoolExecutor(max_workers=1)
+        self._stats.add_gauge("vehicles", self._vehicle_queues)
+
+    def _vehicle_queues(self):
+        return {v.uri: v.queue_depths() for v in self._fleet.all()}
+
+    def _handle_scanning(self):
+        resp = {"version": 1, "status": 0}
+        interfaces = self._scan()
+        resp["interfaces"] = []
+        for i in interfaces:
+            resp["interfaces"].append({"uri": i[0], "info": i[1]})
+        return resp
+
+    def _handle_connect(self, cmd):
+        vehicle = self._fleet.get(cmd["uri"])
+        if not vehicle:
+            vehicle = self._vehicle_factory(
+                cmd["uri"], self._log_pub, self._param_pub, self._conn_pub,
+                self._stats, self._ro_cache, self._record_dir,
+                self._shm_dir, self._crtp_tap)
+            self._fleet.add(vehicle)
+        return _then(vehicle.connect(self._link_executor),
+                     lambda resp: self._strip_toc(resp, cmd.get("toc_hash")))
+
+    @staticmethod
+    def _strip_toc(resp, client_hash):
+        """Leave out the TOCs if the client already has them"""
+        if client_hash is None or resp.get("toc_hash") != client_hash:
+            return resp
+        resp = dict(resp)
+        del resp["log"]
+        del resp["param"]
+        return resp
+
+    def _handle_disconnect(self, cmd):
+        # The vehicle stays in the fleet, so its Crazyflie is reused when
+        # connecting again and its recordings can still be queried
+        vehicle = self._fleet.find(cmd)
+        if vehicle:
+            return self._link_executor.submit(self._disconnect, vehicle)
+        return {"version": 1, "status": 0}
+
+    @staticmethod
+    def _disconnect(vehicle):
+        vehicle.disconnect()
+        return {"version": 1, "status": 0}
+
+    def _handle_vehicle_cmd(self, cmd):
+        vehicle = self._fleet.find(cmd)
+        if not vehicle:
+            return {"version": 1, "status": 0xFE,
+                    "msg": "No connected Crazyflie with "
+                           "URI {}".format(cmd.get("uri"))}
+        if cmd["cmd"] == "log":
+            return vehicle.handle_logging(cmd)
+        if cmd["cmd"] == "param_bulk_set":
+            return vehicle.handle_param_bulk_set(cmd, self._param_executor)
+        if cmd["cmd"] == "param_bulk_get":
+            return vehicle.handle_param_bulk_get(cmd)
+        if cmd["cmd"] == "get_toc":
+            return vehicle.handle_get_toc(cmd)
+        if cmd["cmd"] == "mem":
+            return vehicle.handle_mem(cmd)
+        return vehicle.handle_param(cmd, self._param_executor)
+
+    def _handle_crtp_filter(self, cmd):
+        if not self._crtp_tap:
+            return {"version": 1, "status": 1,
+                    "msg": "The CRTP socket is not enabled"}
+        if "filter" in cmd:
+            try:
+                self._crtp_tap.set_filter(cmd["filter"])
+            except (KeyError, TypeError, ValueError) as e:
+                return {"version": 1, "status": 2,
+                        "msg": "Invalid filter: {}".format(e)}
+        return {"version": 1, "status": 0, "filter": self._crtp_tap.filters}
+
+    def handle(self, cmd):
+        response = {"version": 1}
+        if cmd["cmd"] == "scan":
+            response = self._scan_executor.submit(self._handle_scanning)
+        elif cmd["cmd"] == "connect":
+            response = self._handle_connect(cmd)
+        elif cmd["cmd"] == "disconnect":
+            response = self._handle_disconnect(cmd)
+        elif cmd["cmd"] == "stats":
+            response = {"version": 1, "status": 0,
+                        "stats": self._stats.snapshot()}
+        elif cmd["cmd"] == "crtp_filter":
+            response = self._handle_crtp_filter(cmd)
+        elif cmd["cmd"] in ("log", "param", "param_bulk_set",
+                            "param_bulk_get", "get_toc", "mem"):
+            response = self._handle_vehicle_cmd(cmd)
+        else:
+            response["status"] = 0xFF
+            response["msg"] = "Unknown command {}".format(cmd["cmd"])
+        return response
+
+
+def _error_response(cmd, e):
+    logger.warning("Command {} failed: {}".format(cmd, e))
+    return {"version": 1, "status": 0xFF, "msg": str(e)}
+
+
+def _start_request(handler, stats, frames):
+    """Decode and dispatch a request received on the ROUTER socket. Returns
+    the envelope, the command and the response (or a future of it)."""
+    stats.count(("queues", "commands_in_flight"))
+    # REQ clients add an empty delimiter frame to the envelope, DEALER
+    # clients might not, so the command is always the last frame
+    envelope, cmd = frames[:-1], {}
+    try:
+        request = json.loads(frames[-1])
+        if not isinstance(request, dict):
+            raise ValueError("The request is not a JSON object")
+        cmd = request
+        logger.info("Got command {}".format(cmd))
+        response = handler.handle(cmd)
+    except Exception as e:
+        response = _error_response(cmd or frames[-1], e)
+    return envelope, cmd, response
+
+
+def _reply_frames(stats, envelope, cmd, response, started, handler_time):
+    """Frames of the response to a request, also accounting for it"""
+    if "id" in cmd:
+        response = dict(response, id=cmd["id"])
+    name = cmd.get("cmd")
+    if not isinstance(name, str):
+        name = None
+    if "action" in cmd:
+        name = "{}.{}".format(name, cmd["action"])
+    stats.command_done(name, time.monotonic() - started, handler_time)
+    stats.count(("queues", "commands_in_flight"), -1)
+    return envelope + [json.dumps(response).encode()]
+
+
+class _SrvThread(Thread):
+    """Serves the ROUTER command socket. Requests are dispatched without
+    waiting for earlier ones to complete, responses of pending commands
+    are passed back to this thread over an inproc socket since ZMQ sockets
+    can only be used from one thread."""
+
+    def __init__(self, socket, context, handler, stats, *args):
+        super(_SrvThread, self).__init__(*args)
+        self._socket = socket
+        self._handler = handler
+        self._stats = stats
+
+        # Replies must never be dropped, the clients would wait for them
+        # forever, so the pipe has no high-water mark
+        self._replies = context.socket(zmq.PULL)
+        self._replies.setsockopt(zmq.RCVHWM, 0)
+        self._replies.bind(_REPLY_ADDR)
+        self._reply_push = context.socket(zmq.PUSH)
+        self._reply_push.setsockopt(zmq.SNDHWM, 0)
+        self._reply_push.connect(_REPLY_ADDR)
+        self._reply_lock = Lock()
+
+    def _deferred_reply(self, envelope, cmd, future, started, handler_time):
+        try:
+            response = future.result()
+        except Exception as e:
+            response = _error_response(cmd, e)
+        frames = _reply_frames(self._stats, envelope, cmd, response, started,
+                               handler_time)
+        with self._reply_lock:
+            self._reply_push.send_multipart(frames)
+
+    def _handle_request(self, frames):
+        started = time.monotonic()
+        envelope, cmd, response = _start_request(self._handler, self._stats,
+                                                 frames)
+        handler_time = time.monotonic() - started
+        if isinstance(response, Future):
+            response.add_done_callback(
+                lambda f: self._deferred_reply(envelope, cmd, f, started,
+                                               handler_time))
+        else:
+            self._socket.send_multipart(
+                _reply_frames(self._stats, envelope, cmd, response, started,
+                              handler_time))
 
     def run(self):
         logger.info("Starting server thread")
+        poller = zmq.Poller()
+        poller.register(self._socket, zmq.POLLIN)
+        poller.register(self._replies, zmq.POLLIN)
         while True:
-            # Wait for the command
-            cmd = self._socket.recv_json()
-            response = {"version": 1}
-            logger.info("Got command {}".format(cmd))
-            if cmd["cmd"] == "scan":
-                response = self._handle_scanning()
-            elif cmd["cmd"] == "connect":
-                response = self._handle_connect(cmd["uri"])
-            elif cmd["cmd"] == "disconnect":
-                self._cf.close_link()
-                response["status"] = 0
-            elif cmd["cmd"] == "log":
-                response = self._handle_logging(cmd)
-            elif cmd["cmd"] == "param":
-                response = self._handle_param(cmd)
-            else:
-                response["status"] = 0xFF
-                response["msg"] = "Unknown command {}".format(cmd["cmd"])
-            self._socket.send_json(response)
+            events = dict(poller.poll())
+            if self._replies in events:
+                self._socket.send_multipart(self._replies.recv_multipart())
+            if self._socket in events:
+                self._handle_request(self._socket.recv_multipart())
+
+
+class _CtrlForwarder():
+    """Keeps the newest received set-point for each Crazyflie until it is
+    time to send them.
+
+    Only the newest set-point for each Crazyflie is kept between two sends,
+    so a client sending faster than the radio can handle does not build up
+    a queue of old set-points. Set-points with a timestamp older than max_age
+    seconds are dropped."""
+
+    def __init__(self, fleet, max_age, stats):
+        self._fleet = fleet
+        self._stats = stats
+        self._max_age = max_age
+        self._pending = {}
+
+    def drop_invalid(self, reason):
+        """Count a set-point that could not be used"""
+        logger.warning("Dropping invalid setpoint, {}".format(reason))
+        self._stats.count(("ctrl", "dropped_invalid"))
+
+    def receive_raw(self, msg):
+        """Decode and receive a set-point as sent on the socket"""
+        try:
+            cmd = json.loads(msg)
+        except ValueError as e:
+            self._stats.count(("ctrl", "received"))
+            self.drop_invalid(e)
+            return
+        self.receive(cmd)
+
+    def receive(self, cmd):
+        self._stats.count(("ctrl", "received"))
+        if not isinstance(cmd, dict):
+            self.drop_invalid("not a JSON object")
+            return
+        timestamp = cmd.get("timestamp")
+        if isinstance(timestamp, bool) or \
+                not isinstance(timestamp, (int, float, type(None))):
+            self.drop_invalid("timestamp is not a number")
+            return
+        if not isinstance(cmd.get("uri", ""), str):
+            self.drop_invalid("uri is not a string")
+            return
+        vehicle = self._fleet.find(cmd)
+        if not vehicle:
+            logger.debug("Dropping setpoint for unknown Crazyflie "
+                         "{}".format(cmd.get("uri")))
+            self._stats.count(("ctrl", "dropped_unknown"))
+            return
+        try:
+            (method, fields) = _SETPOINT_TYPES[cmd.get("type", "rpyt")]
+            args = [cmd[f] for f in fields]
+        except (KeyError, TypeError) as e:
+            self.drop_invalid("{} missing or unknown".format(e))
+            return
+        if vehicle.uri in self._pending:
+            self._stats.count(("ctrl", "coalesced"))
+        self._pending[vehicle.uri] = (vehicle, method, args, timestamp)
+
+    def send_pending(self):
+        now = time.time()
+        for (vehicle, method, args, timestamp) in self._pending.values():
+            if timestamp is not None and now - timestamp > self._max_age:
+                logger.debug("Dropping stale setpoint for "
+                             "{}".format(vehicle.uri))
+                self._stats.count(("ctrl", "dropped_stale"))
+                continue
+            try:
+                getattr(vehicle.cf.commander, method)(*args)
+            except Exception as e:
+                # A bad value or link only affects its own Crazyflie
+                self.drop_invalid("{} for {}".format(e, vehicle.uri))
+                continue
+            self._stats.count(("ctrl", "forwarded"))
+        self._pending = {}
 
 
 class _CtrlThread(Thread):
+    """Receives set-points and sends them to the Crazyflies at a fixed
+    rate"""
 
-    def __init__(self, socket, cf, *args):
+    def __init__(self, socket, fleet, rate, max_age, stats, *args):
         super(_CtrlThread, self).__init__(*args)
         self._socket = socket
-        self._cf = cf
+        self._forwarder = _CtrlForwarder(fleet, max_age, stats)
+        self._period = 1.0 / rate
 
     def run(self):
+        next_send = time.monotonic()
         while True:
-            cmd = self._socket.recv_json()
-            self._cf.commander.send_setpoint(cmd["roll"], cmd["pitch"],
-                                             cmd["yaw"], cmd["thrust"])
+            timeout = max(0.0, next_send - time.monotonic())
+            if self._socket.poll(timeout * 1000):
+                # Drain everything received, newer set-points replace older
+                while True:
+                    try:
+                        self._forwarder.receive_raw(
+                            self._socket.recv(zmq.NOBLOCK))
+                    except zmq.Again:
+                        break
+            now = time.monotonic()
+            if now >= next_send:
+                self._forwarder.send_pending()
+                next_send += self._period
+                # Don't try to catch up if we have fallen behind
+                if next_send < now:
+                    next_send = now + self._period
+
+
+def _default_shm_dir():
+    """Shared memory ring buffers are put in RAM backed /dev/shm if it's
+    available"""
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
 
 
 class ZMQServer():
-    """Crazyflie ZMQ server"""
+    """Crazyflie ZMQ server, handling any number of Crazyflies"""
 
-    def __init__(self, base_url, base_port):
-        """Start threads and bind ports"""
-        cflib.crtp.init_drivers()
-        self._cf = Crazyflie(ro_cache=None,
-                             rw_cache=cfclient.config_path + "/cache")
+    def __init__(self, base_url, base_port, ctrl_rate=CTRL_RATE,
+                 ctrl_max_age=CTRL_MAX_AGE, ro_cache=None, stats_interval=0,
+                 record_dir=None, source=None, shm_dir=None, crtp=False,
+                 crtp_filter=None, pub_sndhwm=None, pub_rcvhwm=None,
+                 pub_nodrop=False):
+        """Start threads and bind ports. If a source is given it provides
+        the vehicles instead of connecting to real Crazyflies. The pub_
+        options are set on all the publish sockets, by default ZMQ uses a
+        high-water mark of 1000 messages."""
+        if source is None:
+            cflib.crtp.init_drivers()
+        self._fleet = _Fleet()
+        self._stats = _Stats()
 
         signal.signal(signal.SIGINT, signal.SIG_DFL)
 
         self._base_url = base_url
-        self._context = zmq.Context()
+        self._context = self._create_context()
+        self._pub_options = []
+        if pub_sndhwm is not None:
+            self._pub_options.append((zmq.SNDHWM, pub_sndhwm))
+        if pub_rcvhwm is not None:
+            self._pub_options.append((zmq.RCVHWM, pub_rcvhwm))
+        if pub_nodrop:
+            self._pub_options.append((zmq.XPUB_NODROP, 1))
 
-        cmd_srv = self._bind_zmq_socket(zmq.REP, "cmd",
+        cmd_srv = self._bind_zmq_socket(zmq.ROUTER, "cmd",
                                         base_port + ZMQ_SRV_PORT)
         log_srv = self._bind_zmq_socket(zmq.PUB, "log",
                                         base_port + ZMQ_LOG_PORT)
@@ -339,15 +1857,63 @@ class ZMQServer():
         conn_srv = self._bind_zmq_socket(zmq.PUB, "conn",
                                          base_port + ZMQ_CONN_PORT)
 
-        self._scan_thread = _SrvThread(cmd_srv, log_srv, param_srv, conn_srv,
-                                       self._cf)
+        self._conn_pub = self._create_publisher(conn_srv, "conn")
+        crtp_tap = None
+        if crtp:
+            crtp_srv = self._bind_zmq_socket(zmq.PUB, "crtp",
+                                             base_port + ZMQ_CRTP_PORT)
+            crtp_tap = _CrtpTap(self._create_publisher(crtp_srv, "crtp"),
+                                self._stats, crtp_filter)
+        self._handler = _CommandHandler(
+            self._fleet, self._create_publisher(log_srv, "log"),
+            self._create_publisher(param_srv, "param"), self._conn_pub,
+            self._stats, ro_cache,
+            record_dir or os.path.join(cfclient.config_path, "recordings"),
+            source.create_vehicle if source else None,
+            source.scan if source else None,
+            shm_dir or _default_shm_dir(), crtp_tap)
+
+        self._start(cmd_srv, ctrl_srv, ctrl_rate, ctrl_max_age,
+                    stats_interval)
+
+    def _create_context(self):
+        return zmq.Context()
+
+    def _create_publisher(self, socket, name):
+        return _Publisher(socket, name, self._stats)
+
+    def _start(self, cmd_srv, ctrl_srv, ctrl_rate, ctrl_max_age,
+               stats_interval):
+        """Start serving the command and control sockets"""
+        self._scan_thread = _SrvThread(cmd_srv, self._context, self._handler,
+                                       self._stats)
         self._scan_thread.start()
 
-        self._ctrl_thread = _CtrlThread(ctrl_srv, self._cf)
+        self._ctrl_thread = _CtrlThread(ctrl_srv, self._fleet, ctrl_rate,
+                                        ctrl_max_age, self._stats)
         self._ctrl_thread.start()
 
+        if stats_interval > 0:
+            self._stats_timer = PeriodicTimer(stats_interval,
+                                              self._publish_stats)
+            self._stats_timer.start()
+
+    def run(self):
+        """Serve until the process is stopped. The main thread has to stay
+        alive, otherwise the executor used for scanning refuses new work
+        when the interpreter starts shutting down."""
+        self._scan_thread.join()
+
+    def _publish_stats(self):
+        self._conn_pub.send_json({"version": 1, "event": "stats",
+                                  "stats": self._stats.snapshot()})
+
     def _bind_zmq_socket(self, pattern, name, port):
         srv = self._context.socket(pattern)
+        if pattern == zmq.PUB:
+            # Options have to be set before binding to apply to all peers
+            for (option, value) in self._pub_options:
+                srv.setsockopt(option, value)
         srv_addr = "{}:{}".format(self._base_url, port)
         srv.bind(srv_addr)
         logger.info("Biding ZMQ {} server"
@@ -355,10 +1921,34 @@ class ZMQServer():
         return srv
 
 
+def _crtp_filter_arg(value):
+    import argparse
+
+    (port, _, channel) = value.partition(":")
+    try:
+        f = {"port": int(port)}
+        if channel:
+            f["channel"] = int(channel)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "expected PORT or PORT:CHANNEL, got {}".format(value))
+    return f
+
+
 def main():
     """Main Crazyflie ZMQ application"""
     import argparse
 
+    if os.name == 'posix':
+        print('Disabling standard output for libraries!')
+        stdout = os.dup(1)
+        os.dup2(os.open('/dev/null', os.O_WRONLY), 1)
+        sys.stdout = os.fdopen(stdout, 'w')
+
+    # set SDL to use the dummy NULL video driver,
+    #   so it doesn't need a windowing system.
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+
     parser = argparse.ArgumentParser(prog="cfzmq")
     parser.add_argument("-u", "--url", action="store", dest="url", type=str,
                         default="tcp://127.0.0.1",
@@ -368,6 +1958,71 @@ def main():
     parser.add_argument("-p", "--port", action="store", dest="port", type=int,
                         default=2000,
                         help="Base port to used for ZMQ sockets")
+    parser.add_argument("--ctrl-rate", action="store", dest="ctrl_rate",
+                        type=float, default=CTRL_RATE,
+                        help="Rate (Hz) for sending set-points")
+    parser.add_argument("--ctrl-max-age", action="store",
+                        dest="ctrl_max_age", type=float, default=CTRL_MAX_AGE,
+                        help="Drop set-points with timestamps older than "
+                             "this (s)")
+    parser.add_argument("--ro-cache", action="store", dest="ro_cache",
+                        type=str, default=None,
+                        help="Directory with read-only TOC cache files")
+    parser.add_argument("--stats-interval", action="store",
+                        dest="stats_interval", type=float, default=0,
+                        help="Publish statistics on the connection socket "
+                             "with this interval (s), 0 to disable")
+    parser.add_argument("--record-dir", action="store", dest="record_dir",
+                        type=str, default=None,
+                        help="Directory for log recordings")
+    parser.add_argument("--shm-dir", action="store", dest="shm_dir",
+                        type=str, default=None,
+                        help="Directory for shared memory log buffers "
+                             "(default /dev/shm)")
+    parser.add_argument("--crtp", action="store_true", dest="crtp",
+                        help="Publish the CRTP packets sent and received "
+                             "on a socket of its own")
+    parser.add_argument("--crtp-filter", action="append",
+                        dest="crtp_filter", type=_crtp_filter_arg,
+                        default=[], metavar="PORT[:CHANNEL]",
+                        help="Only publish CRTP packets for this port (and "
+                             "channel), can be given more than once")
+    parser.add_argument("--pub-sndhwm", action="store", dest="pub_sndhwm",
+                        type=int, default=None,
+                        help="Send high-water mark (messages) of the "
+                             "publish sockets")
+    parser.add_argument("--pub-rcvhwm", action="store", dest="pub_rcvhwm",
+                        type=int, default=None,
+                        help="Receive high-water mark (messages) of the "
+                             "publish sockets")
+    parser.add_argument("--pub-nodrop", action="store_true",
+                        dest="pub_nodrop",
+                        help="Count messages dropped because a subscriber "
+                             "is too slow, they are then dropped for all "
+                             "subscribers")
+    parser.add_argument("--asyncio", action="store_true", dest="asyncio",
+                        help="Serve all sockets from one asyncio event loop "
+                             "instead of one thread per socket")
+    parser.add_argument("--sim", action="store", dest="sim", type=int,
+                        nargs="?", const=1, default=0,
+                        help="Serve this many simulated Crazyflies instead "
+                             "of real ones (default 1)")
+    parser.add_argument("--sim-param-delay", action="store",
+                        dest="sim_param_delay", type=float, default=0.0,
+                        help="Time (s) simulated Crazyflies take to answer "
+                             "param requests")
+    parser.add_argument("--replay", action="store", dest="replay", type=str,
+                        default=None,
+                        help="Serve data from a recording file (or directory "
+                             "of recordings) instead of Crazyflies")
+    parser.add_argument("--replay-speed", action="store",
+                        dest="replay_speed", type=float, default=1.0,
+                        help="Replay speed, 2 is twice the recorded rate and "
+                             "0 is as fast as possible")
+    parser.add_argument("--replay-loop", action="store_true",
+                        dest="replay_loop",
+                        help="Start over when reaching the end of a "
+                             "recording")
     (args, _) = parser.parse_known_args()
 
     if args.debug:
@@ -375,9 +2030,26 @@ def main():
     else:
         logging.basicConfig(level=logging.INFO)
 
-    ZMQServer(args.url, args.port)
+    source = None
+    if args.sim:
+        from cfzmq.sim import SimSource
+        source = SimSource(args.sim, args.sim_param_delay)
+    elif args.replay:
+        from cfzmq.replay import ReplaySource
+        source = ReplaySource(args.replay, args.replay_speed,
+                              args.replay_loop)
+
+    server_class = ZMQServer
+    if args.asyncio:
+        from cfzmq.aioserver import AsyncZMQServer
+        server_class = AsyncZMQServer
 
-    # CRTL-C to exit
+    server = server_class(args.url, args.port, args.ctrl_rate,
+                          args.ctrl_max_age, args.ro_cache,
+                          args.stats_interval, args.record_dir, source,
+                          args.shm_dir, args.crtp, args.crtp_filter,
+                          args.pub_sndhwm, args.pub_rcvhwm, args.pub_nodrop)
+    server.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Alternative core for the ZMQ server, serving all the sockets from one asyncio
+event loop instead of one thread per socket.
+
+The cflib callbacks still run in the cflib threads, events published from
+them are handed over to the event loop. Each command is handled in its own
+task, so any number of commands can be pending and they are cancelled when
+the server is stopped.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Future
+
+import zmq
+import zmq.asyncio
+
+from cfzmq import ZMQServer, _CtrlForwarder, _Publisher, _error_response, \
+    _reply_frames, _start_request
+
+__author__ = 'Bitcraze AB'
+__all__ = ['AsyncZMQServer']
+
+logger = logging.getLogger(__name__)
+
+
+class _LoopPublisher(_Publisher):
+    """Publisher for a socket owned by an event loop. Messages can be
+    published from any thread, they are sent from the loop in the order they
+    were published."""
+
+    def __init__(self, loop, socket, name=None, stats=None):
+        # Publishing never waits, so send on a plain socket sharing the
+        # underlying ZMQ socket instead of going through futures. The
+        # shadow doesn't own the socket, so keep the original open.
+        super(_LoopPublisher, self).__init__(
+            zmq.Socket.shadow(socket.underlying), name, stats)
+        self._owner = socket
+        self._loop = loop
+
+    def send_multipart(self, frames):
+        self._loop.call_soon_threadsafe(self._send, frames)
+
+
+class AsyncZMQServer(ZMQServer):
+    """Crazyflie ZMQ server running on an asyncio event loop, call run() to
+    start serving"""
+
+    def __init__(self, *args, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._tasks = set()
+        self._main = None
+        super(AsyncZMQServer, self).__init__(*args, **kwargs)
+
+    def _create_context(self):
+        return zmq.asyncio.Context()
+
+    def _create_publisher(self, socket, name):
+        return _LoopPublisher(self._loop, socket, name, self._stats)
+
+    def _start(self, cmd_srv, ctrl_srv, ctrl_rate, ctrl_max_age,
+               stats_interval):
+        # Nothing runs until run() is called
+        self._cmd_srv = cmd_srv
+        self._ctrl_srv = ctrl_srv
+        self._ctrl_period = 1.0 / ctrl_rate
+        self._forwarder = _CtrlForwarder(self._fleet, ctrl_max_age,
+                                         self._stats)
+        self._stats_interval = stats_interval
+
+    def run(self):
+        """Serve until stop() is called"""
+        logger.info("Starting asyncio server")
+        self._main = self._loop.create_task(self._serve())
+        try:
+            self._loop.run_until_complete(self._main)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def stop(self):
+        """Stop serving, cancelling pending commands. Can be called from
+        any thread."""
+        if self._main:
+            self._loop.call_soon_threadsafe(self._main.cancel)
+
+    async def _serve(self):
+        coros = [self._receive_commands(), self._receive_setpoints(),
+                 self._send_setpoints()]
+        if self._stats_interval > 0:
+            coros.append(self._publish_stats_periodically())
+        try:
+            await asyncio.gather(*coros)
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+
+    async def _receive_commands(self):
+        while True:
+            frames = await self._cmd_srv.recv_multipart()
+            task = self._loop.create_task(self._handle_request(frames))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _handle_request(self, frames):
+        started = time.monotonic()
+        envelope, cmd, response = _start_request(self._handler, self._stats,
+                                                 frames)
+        handler_time = time.monotonic() - started
+        if isinstance(response, Future):
+            try:
+                response = await asyncio.wrap_future(response)
+            except asyncio.CancelledError:
+                self._stats.count(("queues", "commands_in_flight"), -1)
+                raise
+            except Exception as e:
+                response = _error_response(cmd, e)
+        await self._cmd_srv.send_multipart(
+            _reply_frames(self._stats, envelope, cmd, response, started,
+                          handler_time))
+
+    async def _receive_setpoints(self):
+        while True:
+            msg = await self._ctrl_srv.recv()
+            # A bad set-point must not end _serve and stop the server
+            try:
+                self._forwarder.receive_raw(msg)
+            except Exception as e:
+                self._forwarder.drop_invalid(e)
+
+    async def _send_setpoints(self):
+        next_send = self._loop.time()
+        while True:
+            await asyncio.sleep(max(0.0, next_send - self._loop.time()))
+            try:
+                self._forwarder.send_pending()
+            except Exception:
+                logger.exception("Failed to send set-points")
+            now = self._loop.time()
+            next_send += self._ctrl_period
+            # Don't try to catch up if we have fallen behind
+            if next_send < now:
+                next_send = now + self._ctrl_period
+
+    async def _publish_stats_periodically(self):
+        while True:
+            await asyncio.sleep(self._stats_interval)
+            self._publish_stats()
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+
+"""
+asyncio client for the ZMQ server.
+
+Commands are sent on a small pool of DEALER sockets, tagged with an id so any
+number of them can be waiting for a response at the same time. A socket that
+has a command time out is replaced with a new one, since the server (or the
+connection to it) has most likely gone away and later responses on it would
+never arrive.
+
+Log data is received on a subscription of its own for each log
+configuration and decoded into NumPy structured arrays, with the same dtype
+for binary and JSON encoded configurations.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+
+import numpy as np
+import zmq
+import zmq.asyncio
+
+from cfzmq.protocol import ZMQ_CTRL_PORT, ZMQ_LOG_PORT, ZMQ_SRV_PORT, \
+    BINARY_TYPES, log_topic
+
+__author__ = 'Bitcraze AB'
+__all__ = ['Client', 'CommandError', 'LogStream']
+
+logger = logging.getLogger(__name__)
+
+# Time (in seconds) to wait for a response, longer than the time the server
+# waits for the Crazyflie before giving up on a command itself
+COMMAND_TIMEOUT = 15
+# Maximum number of sockets used for sending commands
+POOL_SIZE = 4
+
+
+class CommandError(Exception):
+    """The server answered a command with a non-zero status"""
+
+    def __init__(self, response):
+        super(CommandError, self).__init__(
+            "{} (status {})".format(response.get("msg"), response["status"]))
+        self.status = response["status"]
+        self.response = response
+
+
+class _PoolSocket():
+    """DEALER socket of the pool and the commands waiting for a response on
+    it, keyed by id"""
+
+    def __init__(self, context, addr):
+        self.socket = context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(addr)
+        self.pending = {}
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+
+    async def _read(self):
+        while True:
+            frames = await self.socket.recv_multipart()
+            try:
+                resp = json.loads(frames[-1])
+            except ValueError as e:
+                logger.warning("Dropping invalid response, {}".format(e))
+                continue
+            future = self.pending.pop(resp.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(resp)
+
+    def close(self, error):
+        self._reader.cancel()
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+        self.socket.close()
+
+
+class _SocketPool():
+    """Sockets to the command port, new ones are only opened while all the
+    open ones have commands in flight"""
+
+    def __init__(self, context, addr, size):
+        self._context = context
+        self._addr = addr
+        self._size = size
+        self._sockets = []
+
+    def acquire(self):
+        sock = min(self._sockets, key=lambda s: len(s.pending), default=None)
+        if sock is None or (sock.pending and len(self._sockets) < self._size):
+            sock = _PoolSocket(self._context, self._addr)
+            self._sockets.append(sock)
+        return sock
+
+    def reset(self, sock):
+        """Close a socket, failing the other commands waiting on it"""
+        if sock in self._sockets:
+            self._sockets.remove(sock)
+            logger.warning("No response from {}, reconnecting".format(
+                self._addr))
+            sock.close(ConnectionError("Command socket was reset after a "
+                                       "timeout"))
+
+    def close(self):
+        for sock in self._sockets:
+            sock.close(ConnectionError("Client closed"))
+        self._sockets = []
+
+
+class LogStream():
+    """Log data of one log configuration. Iterate over it with async for to
+    get the samples of each log message as a NumPy structured array with a
+    timestamp field followed by the variables. Arrays of binary data are
+    read-only views of the received message.
+
+    Messages missed because the server or this client dropped them are
+    counted in lost, using the sequence numbers of the messages. Iteration
+    ends when the configuration is deleted."""
+
+    def __init__(self, client, uri, name, socket, dtype):
+        self._client = client
+        self.uri = uri
+        self.name = name
+        self.dtype = dtype
+        self._socket = socket
+        self._deleted = False
+        self.seq = None
+        self.lost = 0
+
+    async def start(self):
+        await self._action("start")
+
+    async def stop(self):
+        await self._action("stop")
+
+    async def delete(self):
+        await self._action("delete")
+
+    async def _action(self, action):
+        await self._client.command("log", uri=self.uri, action=action,
+                                   name=self.name)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._deleted:
+            frames = await self._socket.recv_multipart()
+            samples = self._decode(frames)
+            if samples is not None:
+                return samples
+        self.close()
+        raise StopAsyncIteration
+
+    def _decode(self, frames):
+        msg = json.loads(frames[1])
+        if "seq" in msg:
+            if self.seq is not None and msg["seq"] > self.seq + 1:
+                self.lost += msg["seq"] - self.seq - 1
+            self.seq = msg["seq"]
+        if msg["event"] == "deleted":
+            self._deleted = True
+        elif msg["event"] == "data" and len(frames) == 3:
+            return np.frombuffer(frames[2], self.dtype)
+        elif msg["event"] == "data":
+            return self._from_json([msg["timestamp"]],
+                                   {n: [v] for (n, v)
+                                    in msg["variables"].items()})
+        elif msg["event"] == "batch":
+            return self._from_json(msg["timestamps"], msg["variables"])
+        return None
+
+    def _from_json(self, timestamps, variables):
+        samples = np.empty(len(timestamps), self.dtype)
+        samples["timestamp"] = timestamps
+        for (name, values) in variables.items():
+            samples[name] = values
+        return samples
+
+    def close(self):
+        self._socket.close()
+
+
+class Client():
+    """Client of a ZMQ server, all methods have to be called from the same
+    event loop. The rcvhwm is the high-water mark (in messages) of the log
+    subscriptions, ZMQ drops messages when a subscription reaches it."""
+
+    def __init__(self, url="tcp://127.0.0.1", base_port=2000,
+                 timeout=COMMAND_TIMEOUT, pool_size=POOL_SIZE,
+                 context=None, rcvhwm=None):
+        self._url = url
+        self._base_port = base_port
+        self.timeout = timeout
+        self._rcvhwm = rcvhwm
+        self._context = context or zmq.asyncio.Context.instance()
+        self._pool = _SocketPool(self._context,
+                                 self._addr(ZMQ_SRV_PORT), pool_size)
+        self._ids = itertools.count(1)
+        self._ctrl = None
+        self._streams = []
+        # Log TOCs of the connected Crazyflies and their hashes
+        self._tocs = {}
+
+    def _addr(self, port):
+        return "{}:{}".format(self._url, self._base_port + port)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    async def command(self, cmd, timeout=None, **fields):
+        """Send a command and return the response. Raises CommandError if
+        the status of the response is not 0 and asyncio.TimeoutError if
+        there's no response within the timeout."""
+        msg = dict(fields, version=1, cmd=cmd, id=next(self._ids))
+        sock = self._pool.acquire()
+        future = asyncio.get_running_loop().create_future()
+        sock.pending[msg["id"]] = future
+        try:
+            await sock.socket.send_json(msg)
+            resp = await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self._pool.reset(sock)
+            raise
+        finally:
+            sock.pending.pop(msg["id"], None)
+        if resp["status"] != 0:
+            raise CommandError(resp)
+        return resp
+
+    async def scan(self):
+        """Return the available interfaces as (uri, info) tuples"""
+        resp = await self.command("scan")
+        return [(i["uri"], i["info"]) for i in resp["interfaces"]]
+
+    async def connect(self, uri):
+        """Connect to a Crazyflie and return the response, including the
+        TOCs. The TOCs are only transferred again if they have changed
+        since the last time this client connected to the URI."""
+        fields = {}
+        if uri in self._tocs:
+            fields["toc_hash"] = self._tocs[uri]["toc_hash"]
+        resp = await self.command("connect", uri=uri, **fields)
+        if "log" in resp:
+            self._tocs[uri] = {"toc_hash": resp["toc_hash"],
+                               "log": resp["log"], "param": resp["param"]}
+        else:
+            resp = dict(resp, log=self._tocs[uri]["log"],
+                        param=self._tocs[uri]["param"])
+        return resp
+
+    async def disconnect(self, uri):
+        await self.command("disconnect", uri=uri)
+
+    async def create_log(self, uri, name, variables, period,
+                         encoding="binary", batch=None, start=True):
+        """Create a log configuration and return a LogStream of its data.
+        The batch is a dict with the samples and/or interval limits of the
+        batches, see the log command."""
+        socket = self._context.socket(zmq.SUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        if self._rcvhwm is not None:
+            socket.setsockopt(zmq.RCVHWM, self._rcvhwm)
+        socket.setsockopt(zmq.SUBSCRIBE, log_topic(uri, name))
+        socket.connect(self._addr(ZMQ_LOG_PORT))
+        fields = {"encoding": encoding}
+        if batch:
+            fields["batch"] = batch
+        try:
+            resp = await self.command("log", uri=uri, action="create",
+                                      name=name, variables=list(variables),
+                                      period=period, **fields)
+        except Exception:
+            socket.close()
+            raise
+        if "schema" in resp:
+            dtype = resp["schema"]["dtype"]
+        else:
+            dtype = [["timestamp", "<u4"]] + \
+                [[v, self._log_dtype(uri, v)] for v in variables]
+        stream = LogStream(self, uri, name, socket,
+                           np.dtype([tuple(d) for d in dtype]))
+        self._streams.append(stream)
+        if start:
+            await stream.start()
+        return stream
+
+    def _log_dtype(self, uri, name):
+        """NumPy type of a log variable, from the TOC if it's known"""
+        (group, _, var) = name.partition(".")
+        try:
+            ctype = self._tocs[uri]["log"][group][var]["type"]
+            return BINARY_TYPES[ctype][1]
+        except KeyError:
+            return "<f8"
+
+    async def set_params(self, uri, params):
+        """Set many parameters at once, params maps names to values.
+        Returns the outcome of each parameter, if any of them failed
+        CommandError is raised with the outcomes in the response."""
+        resp = await self.command("param_bulk_set", uri=uri,
+                                  params=dict(params))
+        return resp["params"]
+
+    async def get_params(self, uri, names):
+        """Return the current values of the parameters"""
+        resp = await self.command("param_bulk_get", uri=uri,
+                                  names=list(names))
+        return {n: p["value"] for (n, p) in resp["params"].items()}
+
+    async def send_setpoint(self, uri, type="rpyt", **fields):
+        """Send one set-point, see the control socket for the fields of
+        each type"""
+        if self._ctrl is None:
+            self._ctrl = self._context.socket(zmq.PUSH)
+            self._ctrl.setsockopt(zmq.LINGER, 0)
+            self._ctrl.connect(self._addr(ZMQ_CTRL_PORT))
+        await self._ctrl.send_json(dict(fields, version=1, uri=uri,
+                                        type=type))
+
+    async def stream_setpoints(self, uri, setpoints, type="rpyt"):
+        """Send the set-points (dicts of fields) from an iterable or async
+        iterable as they are produced. Returns the number of set-points
+        sent."""
+        count = 0
+        if hasattr(setpoints, "__aiter__"):
+            async for setpoint in setpoints:
+                await self.send_setpoint(uri, type, **setpoint)
+                count += 1
+        else:
+            for setpoint in setpoints:
+                await self.send_setpoint(uri, type, **setpoint)
+                count += 1
+        return count
+
+    def close(self):
+        """Close all sockets, commands waiting for a response fail with
+        ConnectionError"""
+        self._pool.close()
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+        if self._ctrl is not None:
+            self._ctrl.close()
+            self._ctrl = None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Constants and helpers describing the protocol of the Crazyflie ZMQ server,
+shared by the server and its clients. Importing this module has no side
+effects, unlike the server module.
+"""
+
+import struct
+
+__author__ = 'Bitcraze AB'
+__all__ = ['log_topic', 'BINARY_TYPES', 'CRTP_FRAME', 'CRTP_IN', 'CRTP_OUT',
+           'ZMQ_SRV_PORT', 'ZMQ_LOG_PORT', 'ZMQ_PARAM_PORT', 'ZMQ_CONN_PORT',
+           'ZMQ_CTRL_PORT', 'ZMQ_CRTP_PORT']
+
+# Main command socket for control (ping/pong)
+ZMQ_SRV_PORT = 0
+# Log data socket (publish)
+ZMQ_LOG_PORT = 1
+# Param value updated (publish)
+ZMQ_PARAM_PORT = 2
+# Async event for connection, like connection lost (publish)
+ZMQ_CONN_PORT = 3
+# Control set-poins for Crazyflie (pull)
+ZMQ_CTRL_PORT = 4
+# Raw CRTP packets sent and received, if enabled (publish)
+ZMQ_CRTP_PORT = 5
+
+# Header of the frames published on the CRTP socket: time (us since epoch),
+# direction, port and channel, followed by the payload
+CRTP_FRAME = struct.Struct("<QBBB")
+CRTP_IN = 0
+CRTP_OUT = 1
+
+# Struct and NumPy types used for log variables in binary log data. FP16
+# variables are already converted to float by cflib and are sent as float.
+BINARY_TYPES = {
+    "uint8_t": ("B", "<u1"),
+    "uint16_t": ("H", "<u2"),
+    "uint32_t": ("I", "<u4"),
+    "int8_t": ("b", "<i1"),
+    "int16_t": ("h", "<i2"),
+    "int32_t": ("i", "<i4"),
+    "float": ("f", "<f4"),
+    "FP16": ("f", "<f4"),
+}
+
+
+def log_topic(uri, name, stream="raw"):
+    """Topic of a stream of a log configuration on the log socket. The parts
+    are terminated so that each stream can be subscribed to exactly."""
+    return "{}\0{}\0{}".format(uri, name, stream).encode()
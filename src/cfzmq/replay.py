@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Replay of log recordings made by the ZMQ server, used to serve the ZMQ
+protocol without any Crazyflie connected.
+
+The recorded Crazyflies are served with a log TOC made up of the recorded
+variables and an empty param TOC. Log configurations with variables that were
+recorded in the same recording play back the recorded samples.
+"""
+
+import glob
+import json
+import logging
+import os
+import struct
+import time
+from threading import Thread, Event
+
+from cflib.utils.callbacks import Caller
+
+from cfzmq import _Vehicle
+
+__author__ = 'Bitcraze AB'
+__all__ = ['ReplaySource']
+
+logger = logging.getLogger(__name__)
+
+# Number of samples read from the recording file at a time
+READ_CHUNK = 1000
+
+
+class _TocElement():
+
+    def __init__(self, ctype):
+        self.ctype = ctype
+        self.access = 0
+
+
+class _Toc():
+    """Minimal TOC with the same interface as the cflib TOC"""
+
+    def __init__(self):
+        self.toc = {}
+
+    def add_element(self, complete_name, ctype):
+        [group, name] = complete_name.split(".", 1)
+        self.toc.setdefault(group, {})[name] = _TocElement(ctype)
+
+    def get_element_by_complete_name(self, complete_name):
+        [group, _, name] = complete_name.partition(".")
+        return self.toc.get(group, {}).get(name)
+
+
+class _Recording():
+    """A log recording file, see the record action of the ZMQ server"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header = json.loads(f.readline())
+            self.data_start = f.tell()
+        self.uri = self.header["uri"]
+        self.names = [d[0] for d in self.header["dtype"][1:]]
+        self._struct = struct.Struct(self.header["format"])
+
+    def samples(self):
+        """Iterate over the records in the file"""
+        with open(self.path, "rb") as f:
+            f.seek(self.data_start)
+            while True:
+                data = f.read(READ_CHUNK * self._struct.size)
+                # Skip a partially written last record
+                data = data[:len(data) - len(data) % self._struct.size]
+                if not data:
+                    return
+                for record in self._struct.iter_unpack(data):
+                    yield record
+
+
+class _ReplayVariable():
+
+    def __init__(self, name):
+        self.name = name
+
+
+class _ReplayLogConfig():
+    """Log configuration playing back samples from a recording"""
+
+    def __init__(self, cf, name, period):
+        self._cf = cf
+        self.name = name
+        self.period_in_ms = period
+        self.variables = []
+        self.valid = False
+        self.added = False
+        self.started = False
+        self.data_received_cb = Caller()
+        self.started_cb = Caller()
+        self.added_cb = Caller()
+        self._player = None
+
+    def add_variable(self, name, fetch_as=None):
+        self.variables.append(_ReplayVariable(name))
+
+    def create(self):
+        self.added = True
+        self.added_cb.call(self, True)
+
+    def start(self):
+        self.started = True
+        self.started_cb.call(self, True)
+        if not self._player:
+            self._player = _Player(self, self._cf.source)
+            self._player.start()
+
+    def stop(self):
+        self.stop_playing()
+        self.started = False
+        self.started_cb.call(self, False)
+
+    def delete(self):
+        self.stop_playing()
+        self.added = False
+        self.added_cb.call(self, False)
+
+    def stop_playing(self):
+        if self._player:
+            self._player.stop()
+            self._player = None
+
+
+class _Player(Thread):
+    """Feeds the samples of a recording to a log configuration, at the
+    recorded rate times the replay speed (as fast as possible if 0)"""
+
+    def __init__(self, conf, source, *args):
+        super(_Player, self).__init__(*args)
+        self.daemon = True
+        self._conf = conf
+        self._source = source
+        self._stopped = Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        names = [v.name for v in self._conf.variables]
+        recording = self._source.find_recording(self._conf.uri, names)
+        indexes = [recording.names.index(n) + 1 for n in names]
+        speed = self._source.speed
+        offset = 0
+        last_ts = 0
+        while not self._stopped.is_set():
+            start_ts = None
+            for record in recording.samples():
+                if self._stopped.is_set():
+                    return
+                ts = record[0]
+                if start_ts is None:
+                    start_ts = ts
+                    start_time = time.monotonic()
+                elif speed > 0:
+                    delay = start_time + (ts - start_ts) / 1000.0 / speed - \
+                        time.monotonic()
+                    if delay > 0 and self._stopped.wait(delay):
+                        return
+                last_ts = (ts + offset) & 0xFFFFFFFF
+                data = {n: record[i] for (n, i) in zip(names, indexes)}
+                self._conf.data_received_cb.call(last_ts, data, self._conf)
+            if not self._source.loop or start_ts is None:
+                return
+            # Keep timestamps increasing when starting over
+            offset = last_ts + self._conf.period_in_ms - start_ts
+
+
+class _ReplayLog():
+
+    def __init__(self, cf):
+        self._cf = cf
+        self.toc = _Toc()
+        self.configs = []
+
+    def add_config(self, logconf):
+        if logconf.period_in_ms <= 0:
+            raise AttributeError("The log period is invalid")
+        names = [v.name for v in logconf.variables]
+        for name in names:
+            if not self.toc.get_element_by_complete_name(name):
+                raise KeyError("Variable {} not in TOC".format(name))
+        if not self._cf.source.find_recording(self._cf.uri, names):
+            raise KeyError("Variables {} were not recorded "
+                           "together".format(", ".join(names)))
+        logconf.uri = self._cf.uri
+        logconf.valid = True
+        self.configs.append(logconf)
+
+
+class _ReplayParam():
+
+    def __init__(self):
+        self.toc = _Toc()
+        self.values = {}
+        self.all_updated = Caller()
+        self.all_update_callback = Caller()
+
+    def set_value(self, complete_name, value):
+        raise KeyError("Could not find {} in TOC".format(complete_name))
+
+    def request_param_update(self, complete_name):
+        raise KeyError("Could not find {} in TOC".format(complete_name))
+
+
+class _ReplayMem():
+    """No memories are available when replaying"""
+
+    def __init__(self):
+        self.mems = []
+
+    def get_mem(self, id):
+        return None
+
+
+class _ReplayCommander():
+    """Set-points are accepted but ignored when replaying"""
+
+    def _ignore(self, *args):
+        pass
+
+    send_setpoint = _ignore
+    send_hover_setpoint = _ignore
+    send_velocity_world_setpoint = _ignore
+    send_position_setpoint = _ignore
+    send_stop_setpoint = _ignore
+
+
+class _ReplayCrazyflie():
+    """Stands in for the cflib Crazyflie, with the parts used by the server"""
+
+    def __init__(self, source):
+        self.source = source
+        self.uri = None
+        self.connected = Caller()
+        self.connection_failed = Caller()
+        self.connection_lost = Caller()
+        self.disconnected = Caller()
+        self.connection_requested = Caller()
+        self.packet_received = Caller()
+        self.packet_sent = Caller()
+        self.log = _ReplayLog(self)
+        self.param = _ReplayParam()
+        self.mem = _ReplayMem()
+        self.commander = _ReplayCommander()
+
+    def open_link(self, uri):
+        self.uri = uri
+        self.connection_requested.call(uri)
+        recordings = self.source.recordings.get(uri)
+        if not recordings:
+            self.connection_failed.call(uri, "No recordings of {}".format(uri))
+            return
+        for recording in recordings:
+            for (name, ctype) in recording.header["types"].items():
+                self.log.toc.add_element(name, ctype)
+        self.connected.call(uri)
+        self.param.all_updated.call()
+
+    def close_link(self):
+        for conf in self.log.configs:
+            conf.stop_playing()
+        self.log.configs = []
+        self.disconnected.call(self.uri)
+
+
+class ReplayVehicle(_Vehicle):
+    """Server vehicle getting its data from recordings instead of a
+    Crazyflie"""
+
+    def __init__(self, source, *args):
+        self._source = source
+        super(ReplayVehicle, self).__init__(*args)
+
+    def _create_crazyflie(self, ro_cache):
+        return _ReplayCrazyflie(self._source)
+
+    def _create_log_config(self, name, period):
+        return _ReplayLogConfig(self.cf, name, period)
+
+
+class ReplaySource():
+    """Recordings to replay, from a recording file or a directory of them"""
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.speed = speed
+        self.loop = loop
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, "*.cfrec")))
+        else:
+            paths = [path]
+        self.recordings = {}
+        for p in paths:
+            recording = _Recording(p)
+            self.recordings.setdefault(recording.uri, []).append(recording)
+            logger.info("Replaying {} of {} from {}".format(
+                recording.header["name"], recording.uri, p))
+
+    def find_recording(self, uri, names):
+        """Return the recording with the fewest variables that contains all
+        the names"""
+        found = [r for r in self.recordings.get(uri, [])
+                 if set(names) <= set(r.names)]
+        if not found:
+            return None
+        return min(found, key=lambda r: len(r.names))
+
+    def scan(self):
+        return [(uri, "Replay of {} recording(s)".format(len(recordings)))
+                for (uri, recordings) in self.recordings.items()]
+
+    def create_vehicle(self, *args):
+        return ReplayVehicle(self, *args)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Shared memory ring buffers for passing log data to readers on the same host
+without going through ZMQ.
+
+Each shared log configuration gets a memory mapped file made up of a header
+followed by a ring of fixed size records, using the same binary layout as
+the binary log data. The server is the only writer. For every record it
+first writes the record to its slot and then increments the sequence number
+in the header, so readers never have to lock anything:
+
+    offset  type      content
+    0       char[8]   magic, b"CFZMQRNG"
+    8       uint32    layout version
+    12      uint32    record size in bytes
+    16      uint64    capacity in records
+    24      uint64    sequence number, total number of records written
+    64                capacity records, record n is in slot n % capacity
+
+A reader copying records has to check the sequence number again afterwards,
+records up to and including sequence - capacity might have been overwritten
+while copying them.
+"""
+
+import mmap
+import os
+import struct
+
+__author__ = 'Bitcraze AB'
+__all__ = ['LogRing', 'RingReader']
+
+MAGIC = b"CFZMQRNG"
+LAYOUT_VERSION = 1
+HEADER_SIZE = 64
+
+_HEADER = struct.Struct("<8sIIQ")
+_SEQ = struct.Struct("<Q")
+_SEQ_OFFSET = 24
+
+
+class LogRing():
+    """Writer of a ring buffer, only one thread may write to it"""
+
+    def __init__(self, path, size, capacity):
+        self.path = path
+        self.size = size
+        self.capacity = capacity
+        self._seq = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, HEADER_SIZE + size * capacity)
+            self._mm = mmap.mmap(fd, HEADER_SIZE + size * capacity)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(self._mm, 0, MAGIC, LAYOUT_VERSION, size, capacity)
+        _SEQ.pack_into(self._mm, _SEQ_OFFSET, 0)
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def write(self, record):
+        offset = HEADER_SIZE + (self._seq % self.capacity) * self.size
+        try:
+            self._mm[offset:offset + self.size] = record
+            self._seq += 1
+            _SEQ.pack_into(self._mm, _SEQ_OFFSET, self._seq)
+        except ValueError:
+            # Closed while a sample was being written, drop it
+            pass
+
+    def close(self):
+        """Unmap and remove the file. Readers that have it mapped can still
+        read the data written so far."""
+        self._mm.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class RingReader():
+    """Reader of a ring buffer announced by the server, using NumPy
+
+    The dtype is the one in the announcement from the server. Reading starts
+    with the records written after the reader was created."""
+
+    def __init__(self, path, dtype):
+        import numpy as np
+        self._np = np
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, size, capacity) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ValueError("{} is not a log ring buffer".format(path))
+        self.dtype = np.dtype([tuple(d) for d in dtype])
+        if self.dtype.itemsize != size:
+            raise ValueError("Record size {} does not match the dtype "
+                             "({})".format(size, self.dtype.itemsize))
+        self.capacity = capacity
+        self._seq = self._np.frombuffer(self._mm, "<u8", 1, _SEQ_OFFSET)
+        # Zero copy view of all the slots, in slot order
+        self.slots = self._np.frombuffer(self._mm, self.dtype, capacity,
+                                         HEADER_SIZE)
+        self.position = self.seq
+        self.lost = 0
+
+    @property
+    def seq(self):
+        """Sequence number of the next record to be written"""
+        return int(self._seq[0])
+
+    def read(self):
+        """Return a copy of the records written since the last read, in
+        order. Records overwritten before they could be read are counted in
+        lost."""
+        end = self.seq
+        start = max(self.position, end - self.capacity)
+        slots = self._np.arange(start, end) % self.capacity
+        records = self.slots[slots]
+        # Drop records the writer might have overwritten while copying. The
+        # writer fills the slot of record seq - capacity before incrementing
+        # seq, so that record might be half written already.
+        valid = min(end, max(start, self.seq - self.capacity + 1))
+        self.lost += valid - self.position
+        self.position = end
+        return records[valid - start:]
+
+    def close(self):
+        self.slots = None
+        self._seq = None
+        self._mm.close()
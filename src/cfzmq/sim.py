@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Simulated Crazyflies, used to run and benchmark the ZMQ server without any
+hardware.
+
+Each simulated Crazyflie has a log TOC with synthetic variables of all the
+log types and a param TOC of simulated params. A thread per Crazyflie stands
+in for the radio link: it produces the samples of the started log
+configurations at their period and answers param requests, calling the
+same callbacks as cflib does from its link thread.
+
+The sim.usec variable holds the CLOCK_MONOTONIC time (in us, wrapping at 32
+bits) when the sample was produced, so clients on the same host can measure
+the latency until they receive it.
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import queue
+import time
+from threading import Thread
+
+from cflib.crazyflie.mem import MemoryElement
+from cflib.utils.callbacks import Caller
+
+from cfzmq import _Vehicle
+from cfzmq.replay import _Toc, _ReplayCommander, _ReplayVariable
+
+__author__ = 'Bitcraze AB'
+__all__ = ['SimSource']
+
+logger = logging.getLogger(__name__)
+
+# Simulated log variables and their types
+LOG_VARIABLES = [
+    ("sim.usec", "uint32_t"),
+    ("sim.counter", "uint32_t"),
+    ("sim.u8", "uint8_t"),
+    ("sim.u16", "uint16_t"),
+    ("sim.i8", "int8_t"),
+    ("sim.i16", "int16_t"),
+    ("sim.i32", "int32_t"),
+    ("sim.fp16", "FP16"),
+] + [("sim.f{}".format(i), "float") for i in range(8)]
+
+# Simulated params, their types and if they are read-only
+PARAMS = [
+    ("simparam.ro", "uint8_t", True),
+    ("simparam.u8", "uint8_t", False),
+    ("simparam.u16", "uint16_t", False),
+    ("simparam.i32", "int32_t", False),
+] + [("simparam.f{}".format(i), "float", False) for i in range(8)]
+
+# Simulated memories: id, type and size
+MEMORIES = [
+    (0, MemoryElement.TYPE_TRAJ, 4096),
+    (1, MemoryElement.TYPE_MEMORY_TESTER, 65536),
+]
+# Bytes in each memory packet and the time (in seconds) for a memory packet
+# round trip
+MEM_PACKET_SIZE = 24
+MEM_PACKET_TIME = 0.001
+
+# CRTP ports and channels of the simulated packets
+CRTP_LOG = (5, 2)
+CRTP_PARAM_WRITE = (2, 2)
+
+# Samples are not produced to catch up if the link is further behind than
+# this (in seconds)
+MAX_LAG = 1.0
+
+
+def _value(index, name, ctype, n):
+    """Value of a simulated variable in sample n, index is the position of
+    the variable in the configuration"""
+    if name == "sim.usec":
+        return int(time.monotonic() * 1000000) & 0xFFFFFFFF
+    if name == "sim.counter":
+        return n & 0xFFFFFFFF
+    if ctype.startswith("uint"):
+        return n % 200
+    if ctype.startswith("int"):
+        return n % 200 - 100
+    return math.sin(n * 0.01 * (index + 1))
+
+
+class _SimPacket():
+    """CRTP packet passed to the packet callbacks, the payload only holds
+    the config/param id and the timestamp or value"""
+
+    def __init__(self, port_channel, data):
+        (self.port, self.channel) = port_channel
+        self.data = data
+
+
+class _SimLink(Thread):
+    """Runs the calls scheduled on a simulated Crazyflie in order, like the
+    link thread of cflib. Calls can be scheduled from any thread."""
+
+    def __init__(self, *args):
+        super(_SimLink, self).__init__(*args)
+        self.daemon = True
+        self.start_time = time.monotonic()
+        self._incoming = queue.Queue()
+        self._scheduled = []
+        self._order = itertools.count()
+
+    def call_later(self, delay, fn, *args):
+        self._incoming.put((time.monotonic() + delay, next(self._order), fn,
+                            args))
+
+    def schedule(self, due, fn, *args):
+        """Schedule a call from the link thread itself"""
+        heapq.heappush(self._scheduled, (due, next(self._order), fn, args))
+
+    def close(self):
+        self._incoming.put(None)
+
+    def run(self):
+        while True:
+            timeout = None
+            if self._scheduled:
+                timeout = max(0.0, self._scheduled[0][0] - time.monotonic())
+            try:
+                item = self._incoming.get(timeout=timeout)
+                while True:
+                    if item is None:
+                        return
+                    heapq.heappush(self._scheduled, item)
+                    item = self._incoming.get_nowait()
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            while self._scheduled and self._scheduled[0][0] <= now:
+                (due, _, fn, args) = heapq.heappop(self._scheduled)
+                fn(*args)
+
+
+class _SimLogConfig():
+    """Log configuration producing synthetic samples at its period"""
+
+    def __init__(self, cf, name, period):
+        self._cf = cf
+        self.name = name
+        self.period_in_ms = period
+        self.variables = []
+        self.valid = False
+        self.added = False
+        self.started = False
+        self.data_received_cb = Caller()
+        self.started_cb = Caller()
+        self.added_cb = Caller()
+        self.id = 0
+        self._generation = 0
+        self._count = 0
+        self._types = []
+
+    def add_variable(self, name, fetch_as=None):
+        self.variables.append(_ReplayVariable(name))
+
+    def create(self):
+        self._cf.link.call_later(0, self._set_added, True)
+
+    def start(self):
+        self._cf.link.call_later(0, self._set_started, True)
+
+    def stop(self):
+        self._cf.link.call_later(0, self._set_started, False)
+
+    def delete(self):
+        self._cf.link.call_later(0, self._set_added, False)
+
+    def _set_added(self, added):
+        if not added:
+            self._set_started(False)
+        self.added = added
+        self.added_cb.call(self, added)
+
+    def _set_started(self, started):
+        # Samples scheduled by an earlier start are ignored
+        self._generation += 1
+        self.started = started
+        if started:
+            toc = self._cf.log.toc
+            self._types = [
+                (v.name, toc.get_element_by_complete_name(v.name).ctype)
+                for v in self.variables]
+            self._cf.link.schedule(time.monotonic(), self._sample,
+                                   self._generation, time.monotonic())
+        self.started_cb.call(self, started)
+
+    def _sample(self, generation, due):
+        if generation != self._generation:
+            return
+        now = time.monotonic()
+        due += self.period_in_ms / 1000.0
+        if now - due > MAX_LAG:
+            due = now
+        self._cf.link.schedule(due, self._sample, generation, due)
+        ts = int((now - self._cf.link.start_time) * 1000) & 0xFFFFFFFF
+        data = {name: _value(i, name, ctype, self._count)
+                for (i, (name, ctype)) in enumerate(self._types)}
+        self._count += 1
+        self._cf.packet_received.call(_SimPacket(
+            CRTP_LOG, bytes([self.id & 0xFF]) +
+            (ts & 0xFFFFFF).to_bytes(3, "little")))
+        self.data_received_cb.call(ts, data, self)
+
+
+class _SimLog():
+
+    def __init__(self):
+        self.toc = _Toc()
+        self._next_id = 0
+        for (name, ctype) in LOG_VARIABLES:
+            self.toc.add_element(name, ctype)
+
+    def add_config(self, logconf):
+        if logconf.period_in_ms <= 0:
+            raise AttributeError("The log period is invalid")
+        for v in logconf.variables:
+            if not self.toc.get_element_by_complete_name(v.name):
+                raise KeyError("Variable {} not in TOC".format(v.name))
+        logconf.valid = True
+        logconf.id = self._next_id
+        self._next_id += 1
+
+
+class _SimParam():
+
+    def __init__(self, cf):
+        self._cf = cf
+        self.toc = _Toc()
+        self.values = {}
+        self._ids = {p[0]: i for (i, p) in enumerate(PARAMS)}
+        for (name, ctype, ro) in PARAMS:
+            self.toc.add_element(name, ctype)
+            self.toc.get_element_by_complete_name(name).access = \
+                1 if ro else 0
+            [group, param] = name.split(".")
+            self.values.setdefault(group, {})[param] = "0"
+        self.all_updated = Caller()
+        self.all_update_callback = Caller()
+
+    def _element(self, complete_name):
+        element = self.toc.get_element_by_complete_name(complete_name)
+        if not element:
+            raise KeyError("Could not find {} in TOC".format(complete_name))
+        return element
+
+    def set_value(self, complete_name, value):
+        element = self._element(complete_name)
+        if element.access != 0:
+            raise AttributeError("{} is read-only".format(complete_name))
+        # Converted like cflib does, invalid values raise ValueError
+        if element.ctype == "float":
+            value = str(float(value))
+        else:
+            value = str(int(value))
+        self._cf.packet_sent.call(_SimPacket(
+            CRTP_PARAM_WRITE, bytes([self._ids[complete_name]]) +
+            str(value).encode()))
+        self._cf.link.call_later(self._cf.param_delay, self._updated,
+                                 complete_name, value)
+
+    def request_param_update(self, complete_name):
+        self._element(complete_name)
+        [group, param] = complete_name.split(".")
+        self._cf.link.call_later(self._cf.param_delay, self._updated,
+                                 complete_name, self.values[group][param])
+
+    def _updated(self, complete_name, value):
+        [group, param] = complete_name.split(".")
+        self.values[group][param] = value
+        self.all_update_callback.call(complete_name, value)
+
+
+class _SimMemElement():
+
+    def __init__(self, id, type, size):
+        self.id = id
+        self.type = type
+        self.size = size
+        self.data = bytearray(size)
+
+
+class _SimMem():
+    """Memories that take one packet round trip for every 24 bytes, writes
+    to a memory are queued like in cflib"""
+
+    def __init__(self, cf):
+        self._cf = cf
+        self.mems = [_SimMemElement(*m) for m in MEMORIES]
+        self.mem_read_cb = Caller()
+        self.mem_read_failed_cb = Caller()
+        self.mem_write_cb = Caller()
+        self.mem_write_failed_cb = Caller()
+        self._reading = set()
+        self._busy_until = {}
+
+    def get_mem(self, id):
+        for m in self.mems:
+            if m.id == id:
+                return m
+        return None
+
+    def _transfer_time(self, mem, length):
+        packets = (length + MEM_PACKET_SIZE - 1) // MEM_PACKET_SIZE
+        start = max(time.monotonic(), self._busy_until.get(mem.id, 0))
+        self._busy_until[mem.id] = start + packets * MEM_PACKET_TIME
+        return self._busy_until[mem.id] - time.monotonic()
+
+    def read(self, mem, addr, length):
+        if mem.id in self._reading:
+            return False
+        self._reading.add(mem.id)
+        self._cf.link.call_later(self._transfer_time(mem, length),
+                                 self._read_done, mem, addr, length)
+        return True
+
+    def _read_done(self, mem, addr, length):
+        self._reading.discard(mem.id)
+        self.mem_read_cb.call(mem, addr, mem.data[addr:addr + length])
+
+    def write(self, mem, addr, data, flush_queue=False, progress_cb=None):
+        self._cf.link.call_later(self._transfer_time(mem, len(data)),
+                                 self._write_done, mem, addr, bytes(data))
+        return True
+
+    def _write_done(self, mem, addr, data):
+        mem.data[addr:addr + len(data)] = data
+        self.mem_write_cb.call(mem, addr)
+
+
+class _SimCrazyflie():
+    """Stands in for the cflib Crazyflie, with the parts used by the server"""
+
+    def __init__(self, param_delay):
+        self.param_delay = param_delay
+        self.uri = None
+        self.link = None
+        self.connected = Caller()
+        self.connection_failed = Caller()
+        self.connection_lost = Caller()
+        self.disconnected = Caller()
+        self.connection_requested = Caller()
+        self.packet_received = Caller()
+        self.packet_sent = Caller()
+        self.log = _SimLog()
+        self.param = _SimParam(self)
+        self.mem = _SimMem(self)
+        self.commander = _ReplayCommander()
+
+    def open_link(self, uri):
+        self.uri = uri
+        self.connection_requested.call(uri)
+        self.link = _SimLink()
+        self.link.start()
+        self.link.call_later(0, self.connected.call, uri)
+        self.link.call_later(0, self.param.all_updated.call)
+
+    def close_link(self):
+        if self.link:
+            self.link.close()
+            self.link = None
+        self.disconnected.call(self.uri)
+
+
+class SimVehicle(_Vehicle):
+    """Server vehicle simulating a Crazyflie"""
+
+    def __init__(self, source, *args):
+        self._source = source
+        super(SimVehicle, self).__init__(*args)
+
+    def _create_crazyflie(self, ro_cache):
+        return _SimCrazyflie(self._source.param_delay)
+
+    def _create_log_config(self, name, period):
+        return _SimLogConfig(self.cf, name, period)
+
+
+class SimSource():
+    """A number of simulated Crazyflies, with URIs sim://0, sim://1..."""
+
+    def __init__(self, count=1, param_delay=0.0):
+        self.param_delay = param_delay
+        self.uris = ["sim://{}".format(i) for i in range(count)]
+
+    def scan(self):
+        return [(uri, "Simulated Crazyflie") for uri in self.uris]
+
+    def create_vehicle(self, *args):
+        return SimVehicle(self, *args)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2026 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+
+"""
+End-to-end benchmark of the ZMQ server (cfzmq), using simulated Crazyflies
+so no hardware is needed.
+
+For each log encoding the server is started with --sim, a number of log
+configurations are created and started, and the log socket is read for a
+while. The measurements are:
+
+ * samples received per second
+ * latency from the sample being produced by the simulated Crazyflie until
+   it's received, using the sim.usec variable (so client and server must run
+   on the same host)
+ * server CPU time per sample (Linux only)
+ * round trip time of param writes and bulk param reads
+
+The results can be saved as JSON and compared against an earlier run, the
+script then exits with an error if any measurement got worse by more than
+the tolerance:
+
+    tools/benchmark/zmq_benchmark.py --output baseline.json
+    tools/benchmark/zmq_benchmark.py --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+
+try:
+    import zmq
+except ImportError as e:
+    raise Exception("ZMQ library probably not installed ({})".format(e))
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "..", "..", "src")
+
+SIM_URI = "sim://0"
+
+# Timeout for commands (s)
+CMD_TIMEOUT = 10
+
+# Measurements where a higher value is better, lower is better for the rest
+HIGHER_IS_BETTER = ("samples_per_s",)
+
+# Encodings benchmarked by default, a batch size can be added after a colon
+ENCODINGS = ["json", "binary", "json:10", "binary:10"]
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def _summary(prefix, values, scale=1.0):
+    return {"{}_{}".format(prefix, name): (
+        _percentile(values, p) * scale if values else None)
+        for (name, p) in (("p50", 50), ("p90", 90), ("p99", 99),
+                          ("max", 100))}
+
+
+def _cpu_time(pid):
+    """CPU time (s) used by a process so far, None if not available"""
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            # The command name can contain spaces, skip past it
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / \
+            os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class _Server():
+    """cfzmq running in a subprocess with simulated Crazyflies"""
+
+    def __init__(self, url, port, server_args):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [SRC_DIR] + [p for p in [env.get("PYTHONPATH")] if p])
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "cfzmq", "--sim", "-u", url, "-p",
+             str(port)] + server_args, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        self._context = zmq.Context()
+        self._cmd = self._context.socket(zmq.DEALER)
+        self._cmd.setsockopt(zmq.LINGER, 0)
+        self._cmd.connect("{}:{}".format(url, port))
+        self.log = self._context.socket(zmq.SUB)
+        self.log.setsockopt(zmq.LINGER, 0)
+        self.log.setsockopt(zmq.RCVHWM, 0)
+        self.log.connect("{}:{}".format(url, port + 1))
+        self.log.setsockopt_string(zmq.SUBSCRIBE, u"")
+        self._next_id = 0
+
+    def command(self, cmd):
+        self._next_id += 1
+        cmd = dict(cmd, version=1, id=self._next_id)
+        self._cmd.send_json(cmd)
+        while self._cmd.poll(CMD_TIMEOUT * 1000):
+            resp = self._cmd.recv_json()
+            if resp.get("id") == cmd["id"]:
+                return resp
+        raise Exception("No response to {}".format(cmd))
+
+    def cpu_time(self):
+        return _cpu_time(self.process.pid)
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+        self._context.destroy()
+
+
+def _decode_json(frames, latencies, now_us):
+    msg = json.loads(frames[-1])
+    if msg["event"] == "data":
+        usecs = [msg["variables"]["sim.usec"]]
+    elif msg["event"] == "batch":
+        usecs = msg["variables"]["sim.usec"]
+    else:
+        return 0
+    for usec in usecs:
+        latencies.append((now_us - usec) & 0xFFFFFFFF)
+    return len(usecs)
+
+
+def _decode_binary(frames, latencies, now_us, size):
+    if len(frames) != 3:
+        return 0
+    # sim.usec is the first variable, right after the timestamp
+    records = frames[2]
+    for offset in range(4, len(records), size):
+        (usec,) = struct.unpack_from("<I", records, offset)
+        latencies.append((now_us - usec) & 0xFFFFFFFF)
+    return len(records) // size
+
+
+def bench_log(server, variables, configs, period, duration, encoding):
+    """Stream log data with the given encoding ("json" or "binary",
+    optionally followed by ":<batch size>")"""
+    (encoding, _, batch) = encoding.partition(":")
+    sizes = {}
+    for i in range(configs):
+        cmd = {"cmd": "log", "action": "create", "uri": SIM_URI,
+               "name": "bench{}".format(i), "period": period,
+               "variables": variables, "encoding": encoding}
+        if batch:
+            cmd["batch"] = {"samples": int(batch)}
+        resp = server.command(cmd)
+        if resp["status"] != 0:
+            raise Exception("Could not create log config: {}".format(
+                resp["msg"]))
+        if encoding == "binary":
+            sizes["bench{}".format(i)] = resp["schema"]["size"]
+    for i in range(configs):
+        server.command({"cmd": "log", "action": "start", "uri": SIM_URI,
+                        "name": "bench{}".format(i)})
+
+    # Let the streams settle before measuring
+    warmup = time.monotonic() + min(1.0, duration / 5.0)
+    while time.monotonic() < warmup:
+        if server.log.poll(100):
+            server.log.recv_multipart()
+
+    samples = 0
+    latencies = []
+    cpu_start = server.cpu_time()
+    start = time.monotonic()
+    end = start + duration
+    while time.monotonic() < end:
+        if not server.log.poll(100):
+            continue
+        while True:
+            try:
+                frames = server.log.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            now_us = int(time.monotonic() * 1000000)
+            if encoding == "binary":
+                # The topic is "<uri>\0<config name>\0<stream>"
+                name = frames[0].split(b"\0")[1].decode()
+                samples += _decode_binary(frames, latencies, now_us,
+                                          sizes.get(name, 0) or 1)
+            else:
+                samples += _decode_json(frames, latencies, now_us)
+    elapsed = time.monotonic() - start
+    cpu_end = server.cpu_time()
+
+    for i in range(configs):
+        server.command({"cmd": "log", "action": "delete", "uri": SIM_URI,
+                        "name": "bench{}".format(i)})
+    # Drop whatever is left from the deleted configurations
+    while server.log.poll(200):
+        server.log.recv_multipart()
+
+    result = {"samples_per_s": samples / elapsed}
+    result.update(_summary("latency_ms", latencies, 0.001))
+    if cpu_start is not None and cpu_end is not None and samples:
+        result["cpu_us_per_sample"] = \
+            (cpu_end - cpu_start) / samples * 1000000
+        result["cpu_percent"] = (cpu_end - cpu_start) / elapsed * 100
+    return result
+
+
+def bench_param(server, count, toc):
+    """Round trip times of param writes and bulk reads"""
+    names = sorted("{}.{}".format(group, name)
+                   for group in toc for name in toc[group]
+                   if toc[group][name]["access"] == "RW")
+    set_times = []
+    for i in range(count):
+        started = time.monotonic()
+        resp = server.command({"cmd": "param", "uri": SIM_URI,
+                               "name": names[i % len(names)],
+                               "value": i % 100})
+        set_times.append(time.monotonic() - started)
+        if resp["status"] != 0:
+            raise Exception("Could not set param: {}".format(resp["msg"]))
+    bulk_times = []
+    for i in range(max(1, count // 10)):
+        started = time.monotonic()
+        server.command({"cmd": "param_bulk_get", "uri": SIM_URI,
+                        "names": names})
+        bulk_times.append(time.monotonic() - started)
+    result = _summary("set_rtt_ms", set_times, 1000)
+    result.update(_summary("bulk_get_rtt_ms", bulk_times, 1000))
+    return result
+
+
+def run(args):
+    results = {}
+    for encoding in args.encodings:
+        server = _Server(args.url, args.port, args.server_args)
+        try:
+            server.command({"cmd": "scan"})
+            resp = server.command({"cmd": "connect", "uri": SIM_URI})
+            if resp["status"] != 0:
+                raise Exception("Could not connect: {}".format(resp["msg"]))
+            # sim.usec first so the binary decoding knows where it is
+            variables = ["sim.usec"] + sorted(
+                "sim.{}".format(n) for n in resp["log"]["sim"]
+                if n != "usec")[:args.variables - 1]
+            print("Log encoding {} ...".format(encoding), end=" ",
+                  flush=True)
+            results["log." + encoding] = bench_log(
+                server, variables, args.configs, args.period, args.duration,
+                encoding)
+            print("done")
+            if "param" not in results:
+                print("Params ...", end=" ", flush=True)
+                results["param"] = bench_param(server, args.params,
+                                               resp["param"])
+                print("done")
+        finally:
+            server.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the measurements that are worse than in the baseline"""
+    regressions = []
+    for (name, values) in results.items():
+        for (key, value) in values.items():
+            old = baseline.get(name, {}).get(key)
+            if not old or value is None:
+                continue
+            change = (value - old) / old
+            if key in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append("{} {}: {:.3f} -> {:.3f} ({:+.0f}%)".format(
+                    name, key, old, value, change * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-u", "--url", default="tcp://127.0.0.1",
+                        help="URL used for the server")
+    parser.add_argument("-p", "--port", type=int, default=2100,
+                        help="Base port used for the server")
+    parser.add_argument("--duration", type=float, default=5,
+                        help="Time (s) to measure each log encoding")
+    parser.add_argument("--configs", type=int, default=4,
+                        help="Number of log configurations")
+    parser.add_argument("--variables", type=int, default=8,
+                        help="Number of variables in each configuration")
+    parser.add_argument("--period", type=int, default=1,
+                        help="Log period (ms)")
+    parser.add_argument("--params", type=int, default=200,
+                        help="Number of param writes")
+    parser.add_argument("--encodings", nargs="+", default=ENCODINGS,
+                        help="Log encodings to measure, followed by "
+                             ":<batch size> for batching")
+    parser.add_argument("--server-args", nargs=argparse.REMAINDER,
+                        default=[],
+                        help="Extra arguments for cfzmq, like --asyncio")
+    parser.add_argument("--output", help="Save the results to this file")
+    parser.add_argument("--compare",
+                        help="Compare with results saved by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative change when comparing")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print("Regression: {}".format(r))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()